@@ -5,7 +5,6 @@ Handles schematic placement and world modifications.
 
 import logging
 import json
-import yaml
 import numpy as np
 import amulet
 import amulet.nbt as amulet_nbt
@@ -144,10 +143,15 @@ class LegacySchematicLoader:
     def paste(self, level, ox, oy, oz):
         try:
             from amulet.core.block import Block
+            from amulet.core.version import VersionNumber
         except ImportError:
-            log.error("Could not import amulet.core.block.Block")
+            log.error("Could not import amulet.core.block.Block / amulet.core.version.VersionNumber")
             return
 
+        # Use Java 1.20.2 data version (3578) as a target for modern blocks
+        # Ideally this should match the target map version
+        target_version = VersionNumber(3578)
+
         dimension = "minecraft:overworld"
         
         count = 0
@@ -182,17 +186,6 @@ class LegacySchematicLoader:
                     
                     # Create Block
                     # Usage: Block(platform, version, namespace, base_name, properties)
-                    try:
-                        from amulet.core.version import VersionNumber
-                        from amulet.nbt import StringTag, IntTag
-                    except ImportError:
-                        log.error("Could not import VersionNumber")
-                        continue
-
-                    # Use Java 1.20.2 data version (3578) as a target for modern blocks
-                    # Ideally this should match the target map version
-                    target_version = VersionNumber(3578) 
-                    
                     ns, name = block_key.split(":")
                     
                     try:
@@ -338,7 +331,7 @@ class AmuletEditor:
             min_y, max_y = -64, 320
         
         # Load placements
-        with open(placements_path, 'r') as f: data = yaml.safe_load(f)
+        with open(placements_path, 'r', encoding='utf-8') as f: data = json.load(f)
         
         placements = data.get('placements', [])
         if not placements: log.info("No buildings to place."); return
@@ -391,6 +384,9 @@ class AmuletEditor:
             
             # Linear interpolation from meters to MC Y
             elev = p['elevation']
+            if elev is None:
+                log.warning(f"No elevation for {b_type} at ({x}, {z}). Skipping.")
+                continue
             y_range = max_y - min_y
             m_range = max_meters - min_meters
             if m_range == 0: m_range = 1
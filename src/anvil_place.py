@@ -249,8 +249,8 @@ class AnvilPlacer:
             self.meta = json.load(f)
             
         # Load placements
-        with open(placements_path, 'r') as f:
-            self.placements_data = yaml.safe_load(f)
+        with open(placements_path, 'r', encoding='utf-8') as f:
+            self.placements_data = json.load(f)
             
         # Prepare schema map
         self.schematics = {}
@@ -324,7 +324,7 @@ class AnvilPlacer:
                 
                 # Calculate coordinates
                 wx = int(task['x'])
-                wz = int(task['y']) # y in yaml is Z in world
+                wz = int(task['y']) # y in placements is Z in world
                 
                 # Determine Elevation via Ground Sampling
                 # We need to load the chunk at wx, wz to find the ground
@@ -405,7 +405,7 @@ class AnvilPlacer:
 
 if __name__ == "__main__":
     if len(sys.argv) < 5:
-        print("Usage: python anvil_place.py <world_dir> <placements_yaml> <metadata_json> <config_yaml>")
+        print("Usage: python anvil_place.py <world_dir> <placements_json> <metadata_json> <config_yaml>")
         sys.exit(1)
         
     world_dir = sys.argv[1]
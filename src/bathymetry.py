@@ -5,9 +5,12 @@ from typing import Tuple
 import numpy as np
 import rasterio
 import requests
+from rasterio.io import MemoryFile
 from rasterio.warp import reproject, Resampling
 from scipy import ndimage
 
+from src import geometry
+
 log = logging.getLogger(__name__)
 
 def download_emodnet_bathymetry(bounds: Tuple[float, float, float, float], 
@@ -41,20 +44,19 @@ def download_emodnet_bathymetry(bounds: Tuple[float, float, float, float],
             'bbox': ",".join(map(str, req_bounds)), 'resx': 0.00208333, 'resy': 0.00208333,
         }
         try:
-            resp = requests.get(base_url, params=params, timeout=180, stream=True)
+            resp = requests.get(base_url, params=params, timeout=180)
             resp.raise_for_status()
             
             if 'tiff' not in resp.headers.get('Content-Type', '').lower():
                 continue
 
-            out_path = Path(output_file)
-            with open(out_path, 'wb') as f:
-                for chunk in resp.iter_content(chunk_size=8192): f.write(chunk)
-            
-            with rasterio.open(out_path) as src:
-                data = src.read(1)
-                log.info(f" [✓] Downloaded {coverage}: {data.shape[1]}x{data.shape[0]}, depth {data.min():.1f}m to {data.max():.1f}m")
-                return True
+            # Validate the payload in memory (header only, no band read) before persisting it
+            with MemoryFile(resp.content) as mem, mem.open() as src:
+                width, height = src.width, src.height
+
+            Path(output_file).write_bytes(resp.content)
+            log.info(f" [✓] Downloaded {coverage}: {width}x{height}")
+            return True
         except Exception as e:
             log.warning(f" Failed with {coverage}: {e}")
             
@@ -109,13 +111,15 @@ def merge_land_and_bathymetry(land_file: str, bathymetry_file: str,
             log.info(f" Applied bathymetry offset: X={dx:.6f}, Y={dy:.6f} (CRS units)")
 
         # Resample bathymetry using Cubic for better quality
-        bathy_resampled = np.full(land_data.shape, np.nan, dtype=np.float32)
+        # Uninitialized buffer: the warper fills it with dst_nodata (NaN) before resampling
+        bathy_resampled = np.empty(land_data.shape, dtype=np.float32)
         
         reproject(
             source=b_src.read(1).astype(np.float32), destination=bathy_resampled,
             src_transform=src_transform, src_crs=b_src.crs,
             dst_transform=l_trans, dst_crs=l_crs,
-            resampling=Resampling.cubic, src_nodata=b_src.nodata, dst_nodata=np.nan
+            resampling=Resampling.cubic, src_nodata=b_src.nodata, dst_nodata=np.nan,
+            **geometry.WARP_OPTIONS
         )
         
         # Apply Gaussian smoothing to reduce "squared" / pixelated look
@@ -161,8 +165,9 @@ def merge_land_and_bathymetry(land_file: str, bathymetry_file: str,
     final_bathy = np.minimum(bathy_resampled, -0.01)
     merged = np.where(use_bathy, final_bathy, land_data)
     
-    log.info(f" Bathymetry used: {int(np.sum(use_bathy)):,} pixels ({np.sum(use_bathy)/use_bathy.size*100:.1f}%)")
+    n_bathy = np.count_nonzero(use_bathy)
+    log.info(f" Bathymetry used: {n_bathy:,} pixels ({n_bathy/use_bathy.size*100:.1f}%)")
 
-    meta.update(dtype=rasterio.float32, nodata=None)
+    meta.update(geometry.FLOAT_GTIFF_OPTIONS, dtype=rasterio.float32, nodata=None)
     with rasterio.open(output_file, 'w', **meta) as dst: dst.write(merged, 1)
     log.info(f" [✓] Saved: {output_file}")
@@ -4,14 +4,25 @@ import rasterio
 from pathlib import Path
 from typing import Tuple, Optional, Dict
 from rasterio.warp import reproject, Resampling
+from rasterio.windows import Window
 from scipy import ndimage
 from PIL import Image
 
 log = logging.getLogger(__name__)
-from src.constants import BIOME_IDS
-from src.geometry import compute_pixel_size_meters, compute_slope_degrees
+from src.constants import BIOME_IDS, LAND_COVER_TO_BIOME
+from src.geometry import WARP_OPTIONS, compute_pixel_size_meters, compute_slope_degrees
+from src.kernels import NO_BIOME, bounded_edt, clamp_shallow, classify_biomes
 from src.masks import MaskGenerator
 
+# Beyond this beach penetration (in pixels) scipy's full EDT beats the bounded sweep
+MAX_BOUNDED_EDT_PX = 32
+# Rows per strip for the post-morphology beach/classification stage
+BIOME_STRIP_ROWS = 512
+
+# Land cover byte -> biome byte, so classification does one gather instead of a comparison per class
+LAND_COVER_BIOME_LUT = np.full(256, NO_BIOME, dtype=np.uint8)
+for _lc_class, _biome in LAND_COVER_TO_BIOME.items(): LAND_COVER_BIOME_LUT[_lc_class] = BIOME_IDS[_biome]
+
 class BiomeMapper:
     def __init__(self, config=None):
         self.config = config or {}
@@ -33,11 +44,13 @@ class BiomeMapper:
             log.warning(f"Land cover file not found: {path}")
             return None
         with rasterio.open(path) as src:
-            out = np.zeros(shape, dtype=np.uint8)
+            # Uninitialized buffer: the warper fills pixels outside the source with nodata (0) itself
+            out = np.empty(shape, dtype=np.uint8)
             reproject(
                 source=rasterio.band(src, 1), destination=out,
                 src_transform=src.transform, src_crs=src.crs,
-                dst_transform=transform, dst_crs=crs, resampling=Resampling.nearest
+                dst_transform=transform, dst_crs=crs, resampling=Resampling.nearest, dst_nodata=0,
+                **WARP_OPTIONS
             )
         return out
 
@@ -50,7 +63,9 @@ class BiomeMapper:
         lukewarm_depth: float = -35.0, 
         deep_depth: float = -90.0,
         beach_mask: Optional[np.ndarray] = None,
-        inland_water_kernel_size: int = 3
+        inland_water_kernel_size: int = 3,
+        is_water: Optional[np.ndarray] = None,
+        is_inland_water: Optional[np.ndarray] = None
     ) -> np.ndarray:
         ''' Classifies terrain into biomes based on height, slope, and land cover.
         
@@ -63,50 +78,53 @@ class BiomeMapper:
             :param float deep_depth: Depth for deep ocean
             :param np.ndarray beach_mask: Mask of areas suitable for beaches
             :param int inland_water_kernel_size: Kernel size for inland water detection
+            :param np.ndarray is_water: Precomputed water mask (optional, derived from elevation if omitted)
+            :param np.ndarray is_inland_water: Precomputed inland water mask (optional)
             
             :return: Biome ID array
         '''
-        is_water = elevation <= sea_level
-        is_inland_water = self.mask_generator.detect_inland_water(elevation, sea_level, kernel_size=inland_water_kernel_size)
+        if is_water is None:
+            is_water = elevation <= sea_level
+        if is_inland_water is None:
+            is_inland_water = self.mask_generator.detect_inland_water(elevation, sea_level, kernel_size=inland_water_kernel_size)
         
-        # 1. Main Ocean Conditions (Water AND NOT Inland/Swamp)
-        # "Ocean" = generic water that isn't swamp
-        conds = [
-            is_water & ~is_inland_water & (elevation < deep_depth),      # Deep Ocean
-            is_water & ~is_inland_water & (elevation > lukewarm_depth),  # Lukewarm Ocean
-            is_water & ~is_inland_water,                                 # Ocean
-            ~is_water & (slope >= cliff_threshold),                      # Stone Shore (Cliffs)
-        ]
-        choices = [
-            BIOME_IDS['deep_ocean'], 
-            BIOME_IDS['lukewarm_ocean'], 
-            BIOME_IDS['ocean'],
-            BIOME_IDS['stone_shore'],
-        ]
-
-        # 2. Beach generation (if enabled via mask)
-        if beach_mask is not None:
-            conds.append(~is_water & beach_mask)
-            choices.append(BIOME_IDS['beach'])
-
+        # Single streaming pass over the priority ladder:
+        # 1. Main Ocean (Water AND NOT Inland/Swamp) by depth
+        # 2. Stone Shore (Cliffs), then Beach (if enabled via mask)
         # 3. Land Cover Conditions (Applied if not coastal/cliff)
-        if land_cover is not None:
-            conds += [
-                ~is_water & (land_cover == 90), # Wetland -> Mangrove Swamp
-                ~is_water & (land_cover == 95), # Mangroves -> Mangrove Swamp
-                ~is_water & (land_cover == 10), # Trees -> Forest
-                ~is_water & (land_cover == 60), # Bare -> Badlands
-                ~is_water & (land_cover == 20), # Shrubland -> Savanna (Grassland 30 -> Default Plains)
-                ~is_water & (land_cover == 40)  # Cropland -> Sunflower Plains
-            ]
-            choices += [BIOME_IDS['mangrove_swamp'], BIOME_IDS['mangrove_swamp'], BIOME_IDS['forest'], BIOME_IDS['badlands'], BIOME_IDS['savanna'], BIOME_IDS['sunflower_plains']]
-
-        # 4. Swamp (Inland Water) - Last fallback for water
-        # If it was water, but failed Ocean checks (because it's inland), catch it here.
-        conds.append(is_inland_water)
-        choices.append(BIOME_IDS['mangrove_swamp'])
-
-        return np.select(conds, choices, default=BIOME_IDS['plains']).astype(np.uint8)
+        # 4. Swamp (Inland Water) - Last fallback for water, then Plains
+        has_land_cover, has_beach = land_cover is not None, beach_mask is not None
+        return classify_biomes(
+            is_water, is_inland_water, elevation, slope,
+            land_cover if has_land_cover else np.zeros((0, 0), dtype=np.uint8), LAND_COVER_BIOME_LUT,
+            beach_mask if has_beach else np.zeros((0, 0), dtype=bool),
+            has_land_cover, has_beach, cliff_threshold, lukewarm_depth, deep_depth
+        )
+
+    def generate_beach_mask(self, not_ocean_mask: np.ndarray, slope: np.ndarray, is_water: np.ndarray,
+                            h_scale: float, max_dist_m: float, max_slope: float) -> np.ndarray:
+        ''' Marks flat land within reach of the main ocean as beach.
+        
+            :param np.ndarray not_ocean_mask: True where the pixel is not main ocean (land and inland water)
+            :param np.ndarray slope: Slope data in degrees
+            :param np.ndarray is_water: Water mask
+            :param float h_scale: Horizontal meters per pixel
+            :param float max_dist_m: Maximum distance from the ocean in meters
+            :param float max_slope: Maximum slope in degrees
+            
+            :return: Boolean beach mask
+        '''
+        # Euclidean distance in pixels to the nearest ocean pixel. Only distances up to the cutoff
+        # matter, so the bounded sweep is used unless the cutoff is so wide that a full EDT is cheaper.
+        cutoff_px = max_dist_m / h_scale
+        if cutoff_px <= MAX_BOUNDED_EDT_PX:
+            pixel_dist = bounded_edt(not_ocean_mask, cutoff_px)
+        else:
+            pixel_dist = ndimage.distance_transform_edt(not_ocean_mask)
+        
+        # Beach is near main ocean AND flat enough AND not already water
+        # (classification only applies beach to land pixels anyway)
+        return (pixel_dist * h_scale <= max_dist_m) & (slope <= max_slope) & ~is_water
 
     def create_biome_map(self, elevation_file: str, land_cover_file: Optional[str], 
                         output_file: str, river_mask_file: Optional[str] = None, 
@@ -121,7 +139,7 @@ class BiomeMapper:
         log.info("Generating biome map...")
         
         with rasterio.open(elevation_file) as src:
-            elev, trans, crs, profile = src.read(1).astype(np.float32), src.transform, src.crs, src.profile
+            elev, trans, crs, profile = src.read(1, out_dtype=np.float32), src.transform, src.crs, src.profile
             
             # If elevation is in blocks (pre-scaled), convert back to meters 
             # for slope calculation and biome thresholds which are configured in meters
@@ -158,88 +176,73 @@ class BiomeMapper:
             # Clamp shallow areas near sea level to ensure proper water biome classification
             # Target: 0-1 block elevation areas that should be water (artifacts from bathymetry merge)
             # CRITICAL: Only clamp if NOT steep, to preserve coastal cliff biomes
-            shallow_land = (elev_m > 0) & (elev_m < 1.0) & (slope < cliff_threshold)
-            if np.any(shallow_land):
-                elev_m[shallow_land] = -1.0  # Force to water
-                log.info(f" Clamped {np.sum(shallow_land)} flat shallow coastal pixels to -1 block for biome classification")
-            
-            # Also clamp any negative shallow water
-            shallow_water = (elev_m < 0) & (elev_m > -1.0)
-            if np.any(shallow_water):
-                elev_m[shallow_water] = -1.0
-                log.info(f" Clamped {np.sum(shallow_water)} shallow water pixels to -1 block for biome classification")
+            # Also clamp any negative shallow water. Both clamps run as one fused in-place pass.
+            n_shallow_land, n_shallow_water = clamp_shallow(elev_m, slope, cliff_threshold)
+            if n_shallow_land:
+                log.info(f" Clamped {n_shallow_land} flat shallow coastal pixels to -1 block for biome classification")
+            if n_shallow_water:
+                log.info(f" Clamped {n_shallow_water} shallow water pixels to -1 block for biome classification")
             
             # Get inland water configuration
             inland_water_config = self.config.get('biomes', {}).get('inland_water', {})
             inland_water_kernel = inland_water_config.get('erosion_kernel_size', 4)
 
-            # Generate optional beach mask
-            beach_mask = None
+            # Identify "Main Ocean" vs "Inland Water" once; shared by the beach mask and classification
+            is_water_mask = elev_m <= sea_level
+            is_inland_water = self.mask_generator.detect_inland_water(elev_m, sea_level, kernel_size=inland_water_kernel)
+
+            # Beach configuration (distance from MAIN OCEAN only, so lakes don't grow beaches)
             beaches_config = self.config.get('biomes', {}).get('beaches', {})
-            if beaches_config.get('enabled', True):
-                log.info(" Calculating beach mask using distance transform...")
-                
-                # 1. Identify "Main Ocean" vs "Inland Water"
-                # We need to detect inland water again here (it's also done inside generate_biome_map_array, could optimize but this is clearer)
-                is_water_mask = elev_m <= sea_level
-                is_inland_water = self.mask_generator.detect_inland_water(elev_m, sea_level, kernel_size=inland_water_kernel)
-                is_main_ocean = is_water_mask & ~is_inland_water
-                
-                # 2. Distance from MAIN OCEAN only
-                # If we use just ~is_water_mask, beaches format around lakes.
-                # We want distance from "Main Ocean".
-                # distance_transform_edt computes distance to the nearest non-zero pixel.
-                # So we want to feed it the "Not Ocean" mask.
-                # "Not Ocean" includes Land AND Inland Water.
-                not_ocean_mask = ~is_main_ocean
-                
-                # distance_transform_edt returns Euclidean distance in pixels
-                pixel_dist = ndimage.distance_transform_edt(not_ocean_mask)
-                
-                # Convert max_penetration_m to pixels
-                h_scale = self.config['minecraft']['scale']['horizontal']
-                dist_m = pixel_dist * h_scale
-                
-                max_dist_m = beaches_config.get('max_penetration_m', 50.0)
-                max_slope = beaches_config.get('max_slope_degrees', 15.0)
-                
-                # Beach is near main ocean AND flat enough AND not already water
-                # (Though usually beach is land, sometimes shallow water is beach too? 
-                #  Here we assume beach is land part. The classification logic handles underwater beach if we want,
-                #  but biome_map generation treats beach primarily as land feature usually? 
-                #  Actually generate_biome_map_array has `conds.append(~is_water & beach_mask)` 
-                #  so it only applies to land pixels anyway.)
-                beach_mask = (dist_m <= max_dist_m) & (slope <= max_slope) & ~is_water_mask
+            beaches_enabled = beaches_config.get('enabled', True)
+            h_scale = self.config['minecraft']['scale']['horizontal']
+            max_dist_m = beaches_config.get('max_penetration_m', 50.0)
+            max_slope = beaches_config.get('max_slope_degrees', 15.0)
+            cutoff_px = max_dist_m / h_scale
+            if beaches_enabled:
                 log.info(f" Beach generation: max_penetration={max_dist_m}m, max_slope={max_slope}° (Inland water excluded)")
-
-            # Generate biome map
-            biome_map = self.generate_biome_map_array(
-                elev_m, slope, lc, sea_level, cliff_threshold, lukewarm_depth, deep_depth, 
-                beach_mask=beach_mask, 
-                inland_water_kernel_size=inland_water_kernel
-            )
+                # "Not Ocean" includes Land AND Inland Water
+                not_ocean_mask = ~(is_water_mask & ~is_inland_water)
+
+            # Beach + classification are local, so run them in row strips to keep the distance
+            # field and masks cache/memory sized. Strips carry a halo covering the beach cutoff.
+            # (A full-raster EDT fallback has no bounded halo, so it runs as a single strip.)
+            # Each finished strip is written straight to the output through a window.
+            height, width = elev_m.shape
+            strip_rows = BIOME_STRIP_ROWS if cutoff_px <= MAX_BOUNDED_EDT_PX else height
+            halo = int(np.ceil(cutoff_px)) + 1 if beaches_enabled else 0
             
-            # Apply River Mask (Overwriting other biomes)
-            if river_mask is not None:
-                is_water = elev_m <= sea_level
-                # Apply river biome to river mask pixels
-                # Do we force it even in deep ocean? Probably not, but OSM rivers shouldn't be there.
-                # Do we force it on land? Yes, that's the point.
-                # But if elevation is invalid/undefined?
-                # Just applying directly.
-                # Note: river_mask is boolean logic.
-                
-                # Should we prevent river biome in Deep Ocean?
-                # If elevation < deep_depth, keep Deep Ocean?
-                # Let's say yes for consistency, but OSM data is source of truth?
-                # Let's trust OSM.
-                biome_map[river_mask] = BIOME_IDS['river']
-                log.info(f" Applied River biome to {np.sum(river_mask)} pixels")
-
-            # Save biome map
             profile.update(dtype=rasterio.uint8, count=1, compress='lzw')
             with rasterio.open(output_file, 'w', **profile) as dst:
-                dst.write(biome_map, 1)
+                for r0 in range(0, height, strip_rows):
+                    rows = slice(r0, min(r0 + strip_rows, height))
+                    
+                    beach_mask = None
+                    if beaches_enabled:
+                        h0 = max(rows.start - halo, 0)
+                        h1 = min(rows.stop + halo, height)
+                        beach_mask = self.generate_beach_mask(
+                            not_ocean_mask[h0:h1], slope[h0:h1], is_water_mask[h0:h1],
+                            h_scale, max_dist_m, max_slope
+                        )[rows.start - h0:rows.stop - h0]
+                    
+                    biome_strip = self.generate_biome_map_array(
+                        elev_m[rows], slope[rows], lc[rows] if lc is not None else None,
+                        sea_level, cliff_threshold, lukewarm_depth, deep_depth,
+                        beach_mask=beach_mask,
+                        inland_water_kernel_size=inland_water_kernel,
+                        is_water=is_water_mask[rows],
+                        is_inland_water=is_inland_water[rows]
+                    )
+                    
+                    # Apply River Mask (Overwriting other biomes)
+                    # OSM data is the source of truth, so rivers override even deep ocean or cliffs.
+                    if river_mask is not None:
+                        biome_strip[river_mask[rows]] = BIOME_IDS['river']
+                    
+                    dst.write(biome_strip, 1, window=Window(0, r0, width, rows.stop - r0))
+            
+            if river_mask is not None:
+                log.info(f" Applied River biome to {np.count_nonzero(river_mask)} pixels")
         
         log.info(f"[✓] Biome map saved: {output_file}")
 
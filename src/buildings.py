@@ -3,16 +3,52 @@ Building processing for map2craft.
 Computes building placements from OSM data.
 """
 
-import logging, json, yaml
+import logging, json, math
+from functools import lru_cache
 import numpy as np
 import rasterio
+from rasterio.windows import Window
 from typing import Dict, List, Tuple
 from pathlib import Path
-from pyproj import Transformer
 from src import geometry
 
 log = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; stdlib json writes the same document, just slower
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; without it the whole GeoJSON is loaded at once
+    ijson = None
+
+
+def iter_geojson_features(path: str):
+    ''' Yield features from a GeoJSON FeatureCollection, streaming when ijson is available.
+    
+        :param str path: Path to GeoJSON file
+    '''
+    if ijson is not None:
+        with open(path, 'rb') as f: yield from ijson.items(f, 'features.item', use_float=True)
+    else:
+        with open(path, 'r') as f: yield from json.load(f)['features']
+
+
+# Known types that map to schematics, in substring-match priority order
+KNOWN_BUILDING_TYPES = ('cathedral', 'church', 'lighthouse', 'windmill', 'tower', 'well')
+_KNOWN_BUILDING_TYPE_SET = frozenset(KNOWN_BUILDING_TYPES)
+_GENERIC_BUILDING_VALUES = frozenset(('yes', 'building', 'true'))
+
+
+@lru_cache(maxsize=None)
+def _match_known_type(b_type: str) -> str:
+    ''' First known type contained in the value (case-insensitive), else 'building'. Memoized per value. '''
+    lowered = b_type.lower()
+    return next((kt for kt in KNOWN_BUILDING_TYPES if kt in lowered), 'building')
+
+
 class BuildingsProcessor:
     def __init__(self, config={}):
         self.config = config
@@ -20,26 +56,19 @@ class BuildingsProcessor:
     def determine_building_type(self, props: Dict) -> str:
         ''' Determine simplified building type from OSM properties. '''
         b_type = props.get('building', 'building')
-        
-        # known types that map to schematics
-        KNOWN_TYPES = ['cathedral', 'church', 'lighthouse', 'windmill', 'tower', 'well']
 
         # If generic, look for more specific tags
-        if b_type in ['yes', 'building', 'true']:
-            for tag_key in ['man_made', 'historic', 'amenity', 'tourism']:
+        if b_type in _GENERIC_BUILDING_VALUES:
+            for tag_key in ('man_made', 'historic', 'amenity', 'tourism'):
                 val = props.get(tag_key)
                 if val and val != 'yes':
                     b_type = val
                     break
         
         # Check against known types (exact or substring)
-        if b_type not in KNOWN_TYPES:
-            for kt in KNOWN_TYPES:
-                if kt in b_type.lower():
-                    return kt
-            return 'building'
-            
-        return b_type
+        if b_type in _KNOWN_BUILDING_TYPE_SET:
+            return b_type
+        return _match_known_type(b_type)
 
     def compute_building_placements(self, buildings_geojson: str, elevation_file: str, 
                                     output_file: str, metadata_file: str,
@@ -55,8 +84,7 @@ class BuildingsProcessor:
         '''
         log.info("Computing building placements...")
         
-        # Load buildings and metadata
-        with open(buildings_geojson, 'r') as f: buildings_data = json.load(f)
+        # Load metadata (buildings are streamed below)
         with open(metadata_file, 'r') as f: metadata = json.load(f)
         
         # Parse building type config for unnamed inclusion
@@ -66,47 +94,39 @@ class BuildingsProcessor:
             if 'name' in b_type_cfg:
                 type_config[b_type_cfg['name']] = b_type_cfg.get('include_unnamed', True)
         
-        # Load elevation for height lookup
+        # Elevation grid geometry (pixels are read later, only around the placed buildings)
         with rasterio.open(elevation_file) as src:
-            elevation = src.read(1).astype(np.float32)
-            
-            if is_pre_scaled:
-                v_scale = float(self.config['minecraft']['scale']['vertical'])
-                log.info(f" Converting pre-scaled elevation (blocks) to meters for building heights (scale: {v_scale})")
-                elevation *= v_scale
-
-            transform = src.transform
-            raster_crs = src.crs
+            transform, raster_crs = src.transform, src.crs
+            height, width = src.height, src.width
         
         # Setup coordinate transformation from WGS84 to Raster CRS
-        transformer = Transformer.from_crs("EPSG:4326", raster_crs, always_xy=True)
-        
-        placements = []
+        transformer = geometry.get_transformer("EPSG:4326", raster_crs.to_wkt())
         
-        for feature in buildings_data['features']:
-            props = feature['properties']
-            geom = feature['geometry']
-            
-            # Filter by area if available
-            area = props.get('area_sq_m', 0)
-            if area < min_area and 'building' in props:
-                # If area is explicitly 0 but it's a building way, we might have failed calculation
-                # Nodes (points) won't have area, so we keep them if they are explicitly marked as buildings
-                if area > 0 or geom['type'] != 'Point': continue
-            
+        # Keep point features, skipping buildings explicitly smaller than min_area.
+        # Nodes (points) won't have area, so we keep them if they are explicitly marked as buildings
+        points = []
+        for feature in iter_geojson_features(buildings_geojson):
+            props, geom = feature['properties'], feature['geometry']
             if geom['type'] != 'Point': continue
-            lon, lat = geom['coordinates']
-            
-            # Project to terrain CRS
-            proj_x, proj_y = transformer.transform(lon, lat)
+            area = props.get('area_sq_m', 0)
+            if 0 < area < min_area and 'building' in props: continue
+            points.append((props, geom['coordinates']))
+        
+        # Placements are accumulated column-wise (structure of arrays)
+        keep, types, names = [], [], []
+        cols = rows = np.empty(0, dtype=np.int64)
+        
+        if points:
+            # Project all points to terrain CRS and pixel space in one vectorized pass
+            lons, lats = np.array([coords for _, coords in points], dtype=np.float64).T
+            proj_x, proj_y = geometry.transform_points(transformer, lons, lats)
+            cols, rows = geometry.latlon_to_pixel(proj_x, proj_y, transform)
             
-            # Convert to pixel coordinates
-            col, row = geometry.latlon_to_pixel(proj_x, proj_y, transform)
+            # Check bounds for all points at once
+            in_bounds = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
             
-            # Check bounds
-            if 0 <= row < elevation.shape[0] and 0 <= col < elevation.shape[1]:
-                elev = float(elevation[row, col])
-                
+            for i in np.flatnonzero(in_bounds).tolist():
+                props = points[i][0]
                 b_type = self.determine_building_type(props)
                 name = props.get('name')
                 
@@ -117,22 +137,44 @@ class BuildingsProcessor:
                 if not name and not include_unnamed:
                     continue
                 
-                placement = {
-                    'x': col,
-                    'y': row,
-                    'elevation': elev,
-                    'type': b_type
-                }
-                if name:
-                    placement['name'] = name
-                    
-                placements.append(placement)
-        
-        with open(output_file, 'w') as f: 
-            yaml.dump({
-                'count': len(placements),
-                'placements': placements
-            }, f, sort_keys=False)
+                keep.append(i)
+                types.append(b_type)
+                names.append(name)
+        
+        keep = np.asarray(keep, dtype=np.int64)
+        xs, ys = cols[keep], rows[keep]
+        
+        # Load elevation for height lookup: only the window bounding the placements, as float32
+        elevs = np.empty(keep.size, dtype=np.float32)
+        if keep.size:
+            row_off, col_off = int(ys.min()), int(xs.min())
+            window = Window.from_slices((row_off, int(ys.max()) + 1), (col_off, int(xs.max()) + 1))
+            with rasterio.open(elevation_file) as src:
+                elevation = src.read(1, window=window, out_dtype=np.float32)
+            
+            # Gather elevations in row-major order so reads stream through memory,
+            # then scatter back so placements keep the input feature order
+            order = np.lexsort((xs, ys))
+            elevs[order] = elevation[ys[order] - row_off, xs[order] - col_off]
+        
+        if is_pre_scaled:
+            v_scale = float(self.config['minecraft']['scale']['vertical'])
+            log.info(f" Converting pre-scaled elevation (blocks) to meters for building heights (scale: {v_scale})")
+            elevs *= v_scale
+        
+        placements = []
+        for x, y, elev, b_type, name in zip(xs.tolist(), ys.tolist(), elevs.tolist(), types, names):
+            # NaN (nodata) elevations become null, as JSON has no NaN and orjson writes null anyway
+            placement = {'x': x, 'y': y, 'elevation': elev if math.isfinite(elev) else None, 'type': b_type}
+            if name:
+                placement['name'] = name
+            placements.append(placement)
+        
+        result = {'count': len(placements), 'placements': placements}
+        if orjson is not None:
+            Path(output_file).write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f: json.dump(result, f, indent=2, ensure_ascii=False, allow_nan=False)
         
         log.info(f"[✓] Building placements saved: {output_file}")
         log.info(f"  Buildings placed: {len(placements)}")
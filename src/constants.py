@@ -3,6 +3,8 @@ Centralized constants for Map2Craft.
 Contains definitions for Biomes, Land Cover, Terrain Types, and standard configuration values.
 """
 
+from functools import lru_cache
+
 # Minecraft Biome IDs (internal map2craft mapping)
 # These align with WorldPainter/Minecraft standard IDs where possible
 BIOME_IDS = {
@@ -48,8 +50,12 @@ BIOME_IDS = {
     'sunflower_plains': 129,
 }
 
-# Reverse mapping for visualization/logging
-BIOME_NAMES = {v: k.replace('_', ' ').title() for k, v in BIOME_IDS.items()}
+# Reverse mapping for visualization/logging, built on demand
+@lru_cache(maxsize=None)
+def biome_name(biome_id: int) -> str:
+    ''' Human-readable name for a biome ID (e.g. 'Deep Ocean'), or 'Biome <id>' if unknown. '''
+    key = next((k for k, v in BIOME_IDS.items() if v == biome_id), None)
+    return key.replace('_', ' ').title() if key else f"Biome {biome_id}"
 
 # Visualization Colors (RGB)
 BIOME_COLORS = {
@@ -112,6 +118,17 @@ LAND_COVER_NAMES = {
     0: "No data",
 }
 
+# ESA WorldCover class -> biome name, applied to land pixels that aren't cliffs or beaches
+# (Grassland 30 and unlisted classes fall through to the default Plains)
+LAND_COVER_TO_BIOME = {
+    90: 'mangrove_swamp',    # Wetland -> Mangrove Swamp
+    95: 'mangrove_swamp',    # Mangroves -> Mangrove Swamp
+    10: 'forest',            # Trees -> Forest
+    60: 'badlands',          # Bare -> Badlands
+    20: 'savanna',           # Shrubland -> Savanna
+    40: 'sunflower_plains',  # Cropland -> Sunflower Plains
+}
+
 TERRAIN_COLORS = [
     (175, 175, 175), # 0: Gravel Ocean Floor
     (212, 196, 160), # 1: Sandy Ocean Floor
@@ -1,15 +1,111 @@
+import shutil
+import xml.etree.ElementTree as ET
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import rasterio
-from rasterio.merge import merge
 from pathlib import Path
 import logging
 
 log = logging.getLogger(__name__)
 
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore import UNSIGNED
+    from botocore.config import Config as BotoConfig
+except ImportError:  # boto3 is optional; tiles are then fetched over plain HTTPS
+    boto3 = None
+
+# Public S3 bucket (eu-central-1) holding the Copernicus GLO-30 COG tiles
+COPERNICUS_BUCKET = "copernicus-dem-30m"
+COPERNICUS_REGION = "eu-central-1"
+
+# Concurrent tile downloads; also the size of the keep-alive connection pool.
+# S3 endpoints only speak HTTP/1.1, so parallelism comes from pooled connections
+# rather than HTTP/2 multiplexing over a single socket.
+TILE_DOWNLOAD_WORKERS = 16
+
+# GDAL data type names used in VRT band definitions
+GDAL_TYPE_NAMES = {
+    'uint8': 'Byte', 'int8': 'Int8', 'uint16': 'UInt16', 'int16': 'Int16', 'uint32': 'UInt32',
+    'int32': 'Int32', 'float32': 'Float32', 'float64': 'Float64'
+}
+
+
+def write_mosaic_vrt(tile_files, output_path):
+    ''' Write a single-band GDAL VRT mosaicking the given tiles, mirroring rasterio's merge defaults:
+        grid resolution of the first tile, union of all bounds, nearest resampling,
+        and the first tile wins where tiles overlap.
+        Each tile's ETag (from its .etag sidecar), size and mtime are recorded as dataset metadata,
+        so the VRT's content changes whenever a tile is downloaded again.
+
+        :param list tile_files: Tile GeoTIFF paths (same CRS)
+        :param str output_path: Path to write the .vrt file
+    '''
+    vrt_dir = Path(output_path).parent.resolve()
+    tiles = []
+    for tf in tile_files:
+        with rasterio.open(tf) as src:
+            tiles.append((Path(tf).resolve(), src.bounds, src.res, src.width, src.height))
+            if len(tiles) == 1: crs, dtype, nodata = src.crs, src.dtypes[0], src.nodata
+    
+    res_x, res_y = tiles[0][2]
+    west = min(t[1].left for t in tiles)
+    south = min(t[1].bottom for t in tiles)
+    east = max(t[1].right for t in tiles)
+    north = max(t[1].top for t in tiles)
+    width, height = int(round((east - west) / res_x)), int(round((north - south) / res_y))
+    
+    root = ET.Element('VRTDataset', rasterXSize=str(width), rasterYSize=str(height))
+    ET.SubElement(root, 'SRS').text = crs.to_wkt()
+    ET.SubElement(root, 'GeoTransform').text = f"{west!r}, {res_x!r}, 0.0, {north!r}, 0.0, {-res_y!r}"
+    metadata = ET.SubElement(root, 'Metadata')
+    for path, *_ in tiles:
+        etag_file = path.with_name(path.name + ".etag")
+        etag = etag_file.read_text().strip() if etag_file.exists() else ''
+        stat = path.stat()
+        ET.SubElement(metadata, 'MDI', key=f"TILE_{path.stem}").text = f"{etag} {stat.st_size} {stat.st_mtime_ns}".strip()
+    band = ET.SubElement(root, 'VRTRasterBand', dataType=GDAL_TYPE_NAMES[dtype], band='1')
+    if nodata is not None: ET.SubElement(band, 'NoDataValue').text = repr(nodata)
+    
+    # Later sources paint over earlier ones, so list tiles in reverse for "first wins"
+    for path, bounds, (tile_res_x, tile_res_y), tile_w, tile_h in reversed(tiles):
+        source = ET.SubElement(band, 'ComplexSource' if nodata is not None else 'SimpleSource')
+        try:
+            filename, relative = path.relative_to(vrt_dir).as_posix(), '1'
+        except ValueError:
+            filename, relative = str(path), '0'
+        ET.SubElement(source, 'SourceFilename', relativeToVRT=relative).text = filename
+        ET.SubElement(source, 'SourceBand').text = '1'
+        ET.SubElement(source, 'SrcRect', xOff='0', yOff='0', xSize=str(tile_w), ySize=str(tile_h))
+        ET.SubElement(source, 'DstRect',
+                      xOff=repr((bounds.left - west) / res_x), yOff=repr((north - bounds.top) / res_y),
+                      xSize=repr(tile_w * tile_res_x / res_x), ySize=repr(tile_h * tile_res_y / res_y))
+        if nodata is not None: ET.SubElement(source, 'NODATA').text = repr(nodata)
+    
+    ET.ElementTree(root).write(output_path, encoding='utf-8')
+
 class ElevationLoader:
     def __init__(self, config={}):
         self.config = config
+        
+        # Shared session so tile requests reuse pooled keep-alive connections to S3
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=TILE_DOWNLOAD_WORKERS, pool_maxsize=TILE_DOWNLOAD_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.5)
+        ))
+        
+        # Anonymous S3 client for multipart ranged tile downloads, when boto3 is installed
+        self.s3 = None
+        if boto3 is not None:
+            self.s3 = boto3.client('s3', region_name=COPERNICUS_REGION, config=BotoConfig(
+                signature_version=UNSIGNED, max_pool_connections=TILE_DOWNLOAD_WORKERS
+            ))
+            self.s3_transfer = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8)
 
     def download_copernicus_tile(self, lat, lon, output_dir):
         ''' Download Copernicus DEM tile (GLO-30) from AWS Open Data.
@@ -19,7 +115,7 @@ class ElevationLoader:
             :param float lon: Longitude of the tile
             :param str output_dir: Directory to save the tile
             
-            :return: Path to the downloaded tile or None if failed
+            :return: Path to the downloaded tile (str) or None if failed
         '''
         tile_lat = int(np.floor(lat))
         tile_lon = int(np.floor(lon))
@@ -30,29 +126,75 @@ class ElevationLoader:
         tile_name = f"Copernicus_DSM_COG_10_{lat_code}_00_{lon_code}_00_DEM"
         output_file = Path(output_dir) / f"{tile_name}.tif"
         
+        key = f"{tile_name}/{tile_name}.tif"
+        url = f"https://{COPERNICUS_BUCKET}.s3.amazonaws.com/{key}"
+        etag_file = output_file.with_name(output_file.name + ".etag")
+        
         if output_file.exists():
-            log.info(f"  Tile {lat_code}{lon_code} already exists")
-            return str(output_file)
-            
-        url = f"https://copernicus-dem-30m.s3.amazonaws.com/{tile_name}/{tile_name}.tif"
+            if self._cached_tile_is_current(url, output_file, etag_file):
+                log.info(f"  Tile {lat_code}{lon_code} already exists")
+                return str(output_file)
+            log.info(f"  Cached tile {lat_code}{lon_code} is incomplete or outdated, downloading again")
+        
         log.info(f"  Downloading tile {lat_code}{lon_code} from AWS...")
         
+        # Write to a temporary name so an interrupted download never looks like a cached tile,
+        # and drop any sidecar left from a previous version of the tile
+        part_file = output_file.with_name(output_file.name + ".part")
+        etag_file.unlink(missing_ok=True)
+        etag = None
         try:
-            resp = requests.get(url, timeout=120, stream=True)
-            resp.raise_for_status()
-            with open(output_file, 'wb') as f:
-                for chunk in resp.iter_content(chunk_size=8192): f.write(chunk)
-            return output_file
+            if self.s3 is not None:
+                # Anonymous S3 transfer: ranged parts fetched in parallel
+                etag = self.s3.head_object(Bucket=COPERNICUS_BUCKET, Key=key).get('ETag')
+                self.s3.download_file(COPERNICUS_BUCKET, key, str(part_file), Config=self.s3_transfer)
+            else:
+                resp = self.session.get(url, timeout=120, stream=True)
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                with open(part_file, 'wb') as f: shutil.copyfileobj(resp.raw, f, length=1024 * 1024)
+                etag = resp.headers.get('ETag')
+            
+            part_file.replace(output_file)
+            if etag: etag_file.write_text(etag)
+            return str(output_file)
         except Exception as e:
             log.error(f"  Error downloading {tile_name}: {e}")
+            part_file.unlink(missing_ok=True)
             return None
 
+    def _cached_tile_is_current(self, url, output_file, etag_file):
+        ''' Check a cached tile against the server's Content-Length and ETag (HEAD request).
+            When the server cannot be reached, the cached tile is trusted.
+
+            :param str url: Tile URL
+            :param Path output_file: Cached tile path
+            :param Path etag_file: Sidecar file holding the ETag of the cached tile
+            
+            :return: True if the cached tile can be reused
+        '''
+        try:
+            head = self.session.head(url, timeout=30)
+            head.raise_for_status()
+        except requests.RequestException as e:
+            log.warning(f"  Could not verify cached {output_file.name} ({e}), using it as is")
+            return True
+        
+        size = head.headers.get('Content-Length')
+        if size is not None and int(size) != output_file.stat().st_size: return False
+        
+        etag = head.headers.get('ETag')
+        if etag and etag_file.exists() and etag_file.read_text().strip() != etag: return False
+        
+        if etag and not etag_file.exists(): etag_file.write_text(etag)
+        return True
+
     def download_elevation(self, bounds, output_path):
-        ''' Downloads Copernicus DEM tiles covering the bounds and merges them.
+        ''' Downloads Copernicus DEM tiles covering the bounds and mosaics them into a VRT.
             (AWS Open Data, free, no auth)
 
             :param tuple bounds: (lon_min, lat_min, lon_max, lat_max)
-            :param str output_path: Path to save the merged GeoTIFF
+            :param str output_path: Path to save the mosaic VRT
         '''
         lon_min, lat_min, lon_max, lat_max = bounds
         
@@ -70,45 +212,19 @@ class ElevationLoader:
         temp_dir = Path(output_path).parent / "tiles_temp"
         temp_dir.mkdir(parents=True, exist_ok=True)
         
-        # 2. Download tiles
-        tile_files = []
-        for lat, lon in tiles_needed:
-            tf = self.download_copernicus_tile(lat, lon, temp_dir)
-            if tf: tile_files.append(tf)
+        # 2. Download tiles in parallel (results keep the tile order for a deterministic merge)
+        with ThreadPoolExecutor(max_workers=max(1, min(TILE_DOWNLOAD_WORKERS, len(tiles_needed)))) as executor:
+            results = executor.map(lambda t: self.download_copernicus_tile(*t, temp_dir), tiles_needed)
+            tile_files = [tf for tf in results if tf]
                 
         if not tile_files: raise RuntimeError(
             "No tiles downloaded. Check internet connection or bounds."
         )
             
-        # 3. Merge tiles
-        log.info(f"Merging {len(tile_files)} tiles...")
-        src_files_to_close = []
-        try:
-            src_files = []
-            for tf in tile_files:
-                src = rasterio.open(tf)
-                src_files.append(src)
-                src_files_to_close.append(src)
-                
-            mosaic, out_trans = merge(src_files)
-            
-            out_meta = src_files[0].meta.copy()
-            out_meta.update({
-                "driver": "GTiff",
-                "height": mosaic.shape[1],
-                "width": mosaic.shape[2],
-                "transform": out_trans,
-                "compress": "lzw"
-            })
-            
-            # Save merged
-            with rasterio.open(output_path, "w", **out_meta) as dest:
-                dest.write(mosaic)
-
-            log.info(f"Saved merged elevation to {output_path}")
-            
-        finally:
-            for src in src_files_to_close: src.close()
+        # 3. Mosaic tiles as a VRT index: downstream readers pull only the windows they need
+        log.info(f"Building mosaic of {len(tile_files)} tiles...")
+        write_mosaic_vrt(tile_files, output_path)
+        log.info(f"Saved elevation mosaic to {output_path}")
 
     def download_action(self, target, source, env):
         ''' SCons action to download elevation.
@@ -6,19 +6,25 @@ and other spatial operations.
 """
 
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 from typing import Tuple, Union
 from affine import Affine
+from src.kernels import gradient_magnitude
 
 
 def compute_slope_degrees(
     elevation: np.ndarray,
-    meters_per_pixel: Union[float, Tuple[float, float]]
+    meters_per_pixel: Union[float, Tuple[float, float]],
+    z_scale: float = 1.0
 ) -> np.ndarray:
     ''' Compute slope in degrees from elevation raster.
     
         :param np.ndarray elevation: 2D elevation array in meters
         :param meters_per_pixel: Horizontal resolution (float) or (spacing_y, spacing_x) tuple
+        :param float z_scale: Factor converting elevation to meters, applied per pixel (default 1)
         
         :return: 2D array of slopes in degrees
     '''
@@ -28,6 +34,17 @@ def compute_slope_degrees(
     else:
         spacing_y = spacing_x = float(meters_per_pixel)
     
+    # Fused scale + gradient + magnitude stencil (np.gradient needs at least 2 pixels per axis anyway),
+    # then arctan and degrees in place
+    if elevation.ndim == 2 and min(elevation.shape) >= 2:
+        if elevation.dtype.kind != 'f': elevation = elevation.astype(np.float64)
+        as_dtype = elevation.dtype.type
+        slope = gradient_magnitude(elevation, as_dtype(z_scale), as_dtype(spacing_y), as_dtype(spacing_x))
+        np.arctan(slope, out=slope)
+        return np.degrees(slope, out=slope)
+    
+    if z_scale != 1.0: elevation = elevation * z_scale
+    
     # Compute gradients
     dy, dx = np.gradient(elevation, spacing_y, spacing_x)
     
@@ -55,7 +72,6 @@ def compute_pixel_size_meters(transform: Affine, crs, shape: Tuple[int, int]) ->
     if crs is not None and crs.is_projected: return px, py
 
     # Geographic CRS (degrees): approximate meters per degree at center
-    from pyproj import Geod
     height, width = shape
     
     # Center pixel indices
@@ -66,15 +82,26 @@ def compute_pixel_size_meters(transform: Affine, crs, shape: Tuple[int, int]) ->
     x_center = transform.c + c * transform.a + r * transform.b
     y_center = transform.f + c * transform.d + r * transform.e
     
-    geod = Geod(ellps='WGS84')
+    return _geodesic_pixel_size(x_center, y_center, px, py if transform.e > 0 else -py)
+
+
+@lru_cache(maxsize=None)
+def _wgs84_geod():
+    ''' Shared WGS84 Geod (pyproj imported lazily). '''
+    from pyproj import Geod
+    return Geod(ellps='WGS84')
+
+
+@lru_cache(maxsize=1024)
+def _geodesic_pixel_size(x_center: float, y_center: float, step_x: float, step_y: float) -> Tuple[float, float]:
+    ''' Geodesic length in meters of one pixel step east and north/south of a point. Memoized per grid. '''
+    geod = _wgs84_geod()
     
     # X step (longitude)
-    x2 = x_center + px
-    _, _, dist_x = geod.inv(x_center, y_center, x2, y_center)
+    _, _, dist_x = geod.inv(x_center, y_center, x_center + step_x, y_center)
     
     # Y step (latitude)
-    y2 = y_center + (py if transform.e > 0 else -py)
-    _, _, dist_y = geod.inv(x_center, y_center, x_center, y2)
+    _, _, dist_y = geod.inv(x_center, y_center, x_center, y_center + step_y)
     
     dist_x = abs(dist_x) if dist_x else 30.0
     dist_y = abs(dist_y) if dist_y else 30.0
@@ -82,28 +109,100 @@ def compute_pixel_size_meters(transform: Affine, crs, shape: Tuple[int, int]) ->
     return dist_x, dist_y
 
 
-def latlon_to_pixel(lon: float, lat: float, transform: Affine) -> Tuple[int, int]:
+@lru_cache(maxsize=16)
+def get_transformer(src_crs: str, dst_crs: str):
+    ''' Get a cached pyproj Transformer between two CRS definitions (always x/y order).
+    
+        :param str src_crs: Source CRS (EPSG code or WKT)
+        :param str dst_crs: Destination CRS (EPSG code or WKT)
+        
+        :return: pyproj Transformer
+    '''
+    from pyproj import Transformer
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+# GDAL warper settings shared by every reprojection: all cores and a 512 MB chunk budget
+WARP_OPTIONS = dict(num_threads=os.cpu_count() or 1, warp_mem_limit=512)
+# Same settings in the form WarpedVRT takes them
+WARPED_VRT_OPTIONS = dict(warp_mem_limit=512, warp_extras={'NUM_THREADS': 'ALL_CPUS'})
+# GDAL config for heavy raster passes: multithreaded block decoding, a 512 MB block cache,
+# and no directory listing on open ('TRUE' still probes .aux.xml/.ovr/.msk sidecars by name,
+# unlike 'EMPTY_DIR', which is kept for remote COG reads)
+GDAL_ENV_OPTIONS = dict(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=512, GDAL_DISABLE_READDIR_ON_OPEN='TRUE')
+
+# Creation options for float32 GeoTIFF outputs: 512px tiles for windowed reads,
+# ZSTD with the floating-point predictor, compressed on all cores
+FLOAT_GTIFF_OPTIONS = dict(
+    driver='GTiff', tiled=True, blockxsize=512, blockysize=512,
+    compress='ZSTD', predictor=3, num_threads='ALL_CPUS', BIGTIFF='IF_SAFER'
+)
+# Creation options for uint8 class rasters: same tiling, DEFLATE with horizontal differencing
+BYTE_GTIFF_OPTIONS = dict(
+    driver='GTiff', tiled=True, blockxsize=512, blockysize=512,
+    compress='DEFLATE', predictor=2, num_threads='ALL_CPUS', BIGTIFF='IF_SAFER'
+)
+
+# Below this many points a single transform call beats thread fan-out
+PARALLEL_TRANSFORM_MIN_POINTS = 100_000
+
+
+def transform_points(transformer, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ''' Transform coordinate arrays, splitting large batches across threads.
+    
+        pyproj releases the GIL while transforming (and keeps per-thread PROJ state),
+        so chunks run concurrently on a shared Transformer.
+    
+        :param transformer: pyproj Transformer
+        :param np.ndarray xs: X coordinates (or longitudes)
+        :param np.ndarray ys: Y coordinates (or latitudes)
+        
+        :return: (xs, ys) transformed arrays
+    '''
+    workers = os.cpu_count() or 1
+    if xs.size < PARALLEL_TRANSFORM_MIN_POINTS or workers == 1:
+        tx, ty = transformer.transform(xs, ys)
+        return np.asarray(tx), np.asarray(ty)
+    
+    bounds = np.linspace(0, xs.size, workers + 1).astype(int)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(
+            lambda i: transformer.transform(xs[bounds[i]:bounds[i + 1]], ys[bounds[i]:bounds[i + 1]]),
+            range(workers)
+        ))
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def latlon_to_pixel(lon, lat, transform: Affine):
     ''' Convert lat/lon to pixel coordinates using affine transform.
     
-        :param float lon: Longitude
-        :param float lat: Latitude
+        Accepts scalars or NumPy arrays of coordinates.
+    
+        :param lon: Longitude (float or array)
+        :param lat: Latitude (float or array)
         :param transform: Affine transform from rasterio
         
-        :return: (col, row) pixel coordinates
+        :return: (col, row) pixel coordinates (ints or int64 arrays)
     '''
     # Affine inverse to go from world coords to pixel coords
     col, row = ~transform * (lon, lat)
+    if np.ndim(col): return col.astype(np.int64), row.astype(np.int64)
     return int(col), int(row)
 
 
-def pixel_to_latlon(col: int, row: int, transform: Affine) -> Tuple[float, float]:
+def pixel_to_latlon(col, row, transform: Affine):
     ''' Convert pixel coordinates to lat/lon using affine transform.
     
-        :param int col: Column (x) in pixels
-        :param int row: Row (y) in pixels
+        Accepts scalars or NumPy arrays of pixel indices.
+    
+        :param col: Column (x) in pixels (int or array)
+        :param row: Row (y) in pixels (int or array)
         :param transform: Affine transform from rasterio
         
-        :return: (lon, lat) coordinates
+        :return: (lon, lat) coordinates of pixel centers (floats or float64 arrays)
     '''
+    if np.ndim(col) or np.ndim(row):
+        col = np.asarray(col, dtype=np.float64)
+        row = np.asarray(row, dtype=np.float64)
     lon, lat = transform * (col + 0.5, row + 0.5)  # Center of pixel
     return lon, lat
@@ -1,12 +1,43 @@
+import json, os
+from functools import lru_cache
 from pathlib import Path
 import rasterio
 import numpy as np
-from rasterio.warp import calculate_default_transform, reproject, Resampling, transform_bounds
+from rasterio.warp import calculate_default_transform, Resampling, transform_bounds
 from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src import geometry
+from src.kernels import fix_coastline, fix_ringing, max_ignoring, normalize_to_uint16
 
 log = logging.getLogger(__name__)
 
+# Output tile size; terrain is warped and corrected one block at a time
+TERRAIN_BLOCK_SIZE = 512
+
+
+def _prefetched(read, windows):
+    ''' Yield (window, read(window)) while the next window is read in a background thread.
+    
+        GDAL releases the GIL while warping and decoding, so reads overlap with the kernels and
+        writes on the calling thread. Each dataset is still only touched by one thread at a time.
+    
+        :param read: Callable taking a window and returning its data
+        :param windows: Iterable of windows, in processing order
+    '''
+    windows = list(windows)
+    if not windows: return
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(read, windows[0])
+        for i, window in enumerate(windows):
+            data = pending.result()
+            if i + 1 < len(windows): pending = executor.submit(read, windows[i + 1])
+            yield window, data
+
+
 class TerrainProcessor:
     def __init__(self, config={}):
         self.config = config
@@ -21,7 +52,7 @@ class TerrainProcessor:
             :param tuple bounds: Optional (lon_min, lat_min, lon_max, lat_max) to crop to
         '''
         log.info(f"Processing terrain: {input_path} -> {output_path}")
-        with rasterio.open(input_path) as src:
+        with rasterio.Env(**geometry.GDAL_ENV_OPTIONS), rasterio.open(input_path) as src:
             # If bounds provided, calculate transform for those bounds
             if bounds:
                 # Transform bounds from WGS84 to target CRS
@@ -38,94 +69,55 @@ class TerrainProcessor:
                 )
             
             kwargs = src.meta.copy()
+            kwargs.update(geometry.FLOAT_GTIFF_OPTIONS)
             kwargs.update({
                 'crs': target_crs,
                 'transform': transform,
                 'width': width,
                 'height': height,
                 'dtype': rasterio.float32,
-                'nodata': None
+                'nodata': None,
+                'blockxsize': TERRAIN_BLOCK_SIZE,
+                'blockysize': TERRAIN_BLOCK_SIZE
             })
+            vrt_grid = dict(crs=target_crs, transform=transform, width=width, height=height)
 
-            with rasterio.open(output_path, 'w', **kwargs) as dst:
-                # 1. Resample Elevation using Cubic for smooth terrain
-                # We do this into a memory array first so we can read and modify it
-                elev_dst = np.zeros((height, width), dtype=np.float32)
+            # Land/water mask resampled with Nearest neighbor to keep it sharp: land (elev >= 0) for
+            # coastline preservation, any water (elev < 0) for the ringing fix. Thresholding the nearest
+            # sample of the elevation equals nearest-resampling a thresholded source mask, so both layers
+            # warp straight from the source and only the source windows the output covers are read.
+            # Pixels outside the source read as NaN, which fails both tests (mask 0), as before.
+            with WarpedVRT(src, resampling=Resampling.cubic, **vrt_grid, **geometry.WARPED_VRT_OPTIONS) as vrt_elev, \
+                 WarpedVRT(src, resampling=Resampling.nearest, nodata=np.nan, dtype=rasterio.float32,
+                           **vrt_grid, **geometry.WARPED_VRT_OPTIONS) as vrt_nearest, \
+                 rasterio.open(output_path, 'w', **kwargs) as dst:
+                # 1. Resample Elevation using Cubic for smooth terrain (warped ahead of processing)
+                def read_block(window):
+                    nearest = vrt_nearest.read(1, window=window)
+                    mask = (nearest >= 0) if preserve_coastline else (nearest < 0)
+                    return vrt_elev.read(1, window=window, out_dtype=np.float32), mask.view(np.uint8)
                 
-                reproject(
-                    source=rasterio.band(src, 1),
-                    destination=elev_dst,
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=target_crs,
-                    resampling=Resampling.cubic
-                )
-                
-                dst.write(elev_dst, 1)
-
-                # 2. Coastline Preservation: 
-                # If enabled, enforces a sharp transition between land and water based on the original land mask.
-                # This prevents "muddy" coasts when upscaling but creates artifacts if we have real bathymetry.
-                if preserve_coastline:
-                    # Resample a binary "Land Mask" using Nearest neighbor to keep it sharp
-                    # Create a binary mask of the source land (elev >= 0)
-                    src_data = src.read(1)
-                    land_mask_src = (src_data >= 0).astype(np.float32)
-                    
-                    land_mask_dst = np.zeros_like(elev_dst, dtype=np.float32)
-                    reproject(
-                        source=land_mask_src,
-                        destination=land_mask_dst,
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=transform,
-                        dst_crs=target_crs,
-                        resampling=Resampling.nearest  # Sharp!
-                    )
-                    
-                    # Fix Coastline: Ensure land pixels have elevation >= 0 and water pixels < 0
-                    # Using 0.01/-0.01 as small buffers to avoid ambiguity
-                    land_indices = land_mask_dst >= 0.5
-                    water_indices = land_mask_dst < 0.5
-                    
-                    # Force Land to be >= 0.01m if Cubic made it < 0
-                    land_correction = (land_indices) & (elev_dst < 0)
-                    elev_dst[land_correction] = 0.01
-                    
-                    # Force Water to be < 0m if Cubic made it >= 0
-                    water_correction = (water_indices) & (elev_dst >= 0)
-                    elev_dst[water_correction] = -0.01
-                else:
-                    # Bathymetry mode: Don't force hard coastlines, but DO fix cubic interpolation artifacts
-                    # Cubic creates "ringing" near cliffs: positive bumps at base, then undershoots
-                    # This appears as a 1-block land line separated from coast by 2 blocks
-                    
-                    # Read source to identify water areas (use 0 threshold to catch all water)
-                    src_data = src.read(1)
-                    water_src = (src_data < 0).astype(np.float32)  # Any water in source
-                    
-                    water_dst = np.zeros_like(elev_dst, dtype=np.float32)
-                    reproject(
-                        source=water_src,
-                        destination=water_dst,
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=transform,
-                        dst_crs=target_crs,
-                        resampling=Resampling.nearest
-                    )
+                n_ringing = 0
+                for window, (elev_dst, mask_dst) in _prefetched(read_block, (w for _, w in dst.block_windows(1))):
+                    # 2. Coastline Preservation: 
+                    # If enabled, enforces a sharp transition between land and water based on the original land mask.
+                    # This prevents "muddy" coasts when upscaling but creates artifacts if we have real bathymetry.
+                    if preserve_coastline:
+                        # Fix Coastline: Ensure land pixels have elevation >= 0 and water pixels < 0
+                        # Using 0.01/-0.01 as small buffers to avoid ambiguity (single fused pass)
+                        fix_coastline(elev_dst, mask_dst)
+                    else:
+                        # Bathymetry mode: Don't force hard coastlines, but DO fix cubic interpolation artifacts
+                        # Cubic creates "ringing" near cliffs: positive bumps at base, then undershoots
+                        # This appears as a 1-block land line separated from coast by 2 blocks
+                        
+                        # Fix cubic ringing: areas that should be water but became positive.
+                        # Only small positive bumps (< 2.0) are forced slightly negative to mark them as water
+                        n_ringing += fix_ringing(elev_dst, mask_dst, 2.0)
                     
-                    # Fix cubic ringing: areas that should be water but became positive
-                    # Use a low threshold to catch pixels that are even partially water
-                    ringing_artifacts = (water_dst > 0.1) & (elev_dst > 0) & (elev_dst < 2.0)  # Only fix small positive bumps
-                    if np.any(ringing_artifacts):
-                        # Force these to slightly negative to mark as water
-                        elev_dst[ringing_artifacts] = -0.1
-                        log.info(f"Fixed {np.sum(ringing_artifacts)} cubic ringing artifacts at cliffs")
-                
-                # Write final result
-                dst.write(elev_dst, 1)
+                    dst.write(elev_dst, 1, window=window)
+
+            if n_ringing: log.info(f"Fixed {n_ringing} cubic ringing artifacts at cliffs")
         log.info(f"Terrain processed.")
 
     def scale_raster_values(self, input_path, output_path, scale_factor):
@@ -138,21 +130,41 @@ class TerrainProcessor:
         '''
         log.info(f"Scaling raster: {input_path} by {scale_factor:.4f}")
         with rasterio.open(input_path) as src:
-            data = src.read(1)
+            data = src.read(1, out_dtype=np.float32)
             
-            # Scale values
-            scaled_data = data * scale_factor
+            # Preserve nodata (mask taken before scaling)
+            nodata_mask = (data == src.nodata) if src.nodata is not None else None
             
-            # Preserve nodata
-            if src.nodata is not None:
-                mask = (data == src.nodata)
-                scaled_data[mask] = src.nodata
+            # Scale values in place
+            np.multiply(data, scale_factor, out=data)
+            if nodata_mask is not None: np.copyto(data, src.nodata, where=nodata_mask)
             
             meta = src.meta.copy()
-            meta.update(dtype=rasterio.float32)
+            meta.update(geometry.FLOAT_GTIFF_OPTIONS, dtype=rasterio.float32)
             
             with rasterio.open(output_path, 'w', **meta) as dst:
-                dst.write(scaled_data.astype(np.float32), 1)
+                dst.write(data, 1)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _land_max(path, mtime):
+        ''' Maximum valid value of a raster, streamed block by block (nodata and NaN excluded).
+            Memoized on (path, mtime) so repeated builds in one process skip the scan.
+        
+            :param str path: Raster path
+            :param float mtime: Modification time of the raster (cache key)
+            
+            :return: Maximum value as float
+        '''
+        land_max = -np.inf
+        with rasterio.Env(**geometry.GDAL_ENV_OPTIONS), rasterio.open(path, sharing=False) as ref:
+            has_nodata = ref.nodata is not None
+            nodata = float(ref.nodata) if has_nodata else 0.0
+            for _, window in ref.block_windows(1):
+                land_max = max(land_max, max_ignoring(ref.read(1, window=window), nodata, has_nodata))
+        if land_max == -np.inf:
+            raise ValueError("Land reference file is empty")
+        return float(land_max)
 
     def generate_heightmap_image(self, input_path, output_path, land_reference_path=None, is_pre_scaled=False, water_threshold_m=0.0):
         ''' Converts processed elevation (meters) to 16-bit PNG for WorldPainter.
@@ -182,19 +194,9 @@ class TerrainProcessor:
         # Determine Scaling Parameters
         if land_reference_path and Path(land_reference_path).exists():
             try:
-                with rasterio.open(land_reference_path) as ref:
-                    # Read finding max value, handling nodata
-                    ref_data = ref.read(1)
-                    # Filter nodata if set
-                    if ref.nodata is not None:
-                         ref_data = ref_data[ref_data != ref.nodata]
-                    
-                    if ref_data.size > 0:
-                        land_max = float(np.max(ref_data))
-                        # Avoid strictly 0 max if flat
-                        if land_max < 10: land_max = 64
-                    else:
-                        raise ValueError("Land reference file is empty")
+                land_max = self._land_max(land_reference_path, os.path.getmtime(land_reference_path))
+                # Avoid strictly 0 max if flat
+                if land_max < 10: land_max = 64
             except Exception as e:
                 log.error(f"Failed to read land reference {land_reference_path}: {e}")
                 raise
@@ -217,24 +219,10 @@ class TerrainProcessor:
 
         # Simplified Approach based on user request:
         # "The heightmap is the most important file in the project, so it is always present."
-        # This implies we should trust it exists and read it.
+        # This implies we should trust it exists (land_max was read from it above).
         
         if not land_reference_path or not Path(land_reference_path).exists():
              raise FileNotFoundError(f"Land reference file not found: {land_reference_path}")
-
-        try:
-            with rasterio.open(land_reference_path) as ref:
-                ref_data = ref.read(1)
-                if ref.nodata is not None:
-                        ref_data = ref_data[ref_data != ref.nodata]
-                
-                if ref_data.size > 0:
-                    land_max = float(np.max(ref_data))
-                    if land_max < 10: land_max = 64
-                else:
-                    raise ValueError("Land reference file contains no valid data")
-        except Exception as e:
-             raise RuntimeError(f"Critical failure reading land reference: {e}")
         
         if mp['scale']['auto_fit']:
             # AUTO-FIT MODE: Scale to fill build limits
@@ -276,61 +264,57 @@ class TerrainProcessor:
         
         log.info(f"Clipping Range: {calc_min_elev:.2f}m to {calc_max_elev:.2f}m")
         
-        with rasterio.open(input_path) as src:
-            data = src.read(1)
-            
-            # Ensure water areas (below threshold) are capped at -1 block maximum (Y=61)
-            # This prevents shallow water from appearing as land at sea level (Y=62)
-            # Threshold is in meters, but data might be in blocks (if is_pre_scaled)
-            water_threshold = water_threshold_m
-            if is_pre_scaled:
-                # If pre-scaled, elevation data is in blocks, so we multiply threshold by 1/vertical_scale
-                # Actually, 1.0m threshold should become (1.0 / vertical_scale) blocks.
-                water_threshold = water_threshold_m / vertical_scale
-            
-            water_mask = data < water_threshold
-            if np.any(water_mask):
-                # We force it to be at least -1.0 blocks below the sea_level_y anchor
-                # This ensures the heightmap value for these pixels is < the value for 0m
-                data[water_mask] = np.minimum(data[water_mask], -1.0 / (1.0 if not is_pre_scaled else 1.0)) # Force at least 1 block deep
-                # Wait, if data is meters, force to -1.0 * vertical_scale meters? No.
-                # data is in current units. 
-                # If is_pre_scaled=False (meters): we want it to be -1.0 * vertical_scale meters to result in -1 block.
-                # If is_pre_scaled=True (blocks): we want it to be -1.0 blocks.
-                
-                target_min_depth_in_units = -1.0 if is_pre_scaled else -1.0 * vertical_scale
-                data[water_mask] = np.minimum(data[water_mask], target_min_depth_in_units)
+        # Sidecar values are fixed by now; it is written once the raster is closed
+        sidecar = {
+            "min_meters": calc_min_elev,
+            "max_meters": calc_max_elev,
+            "scale_factor_vertical": scale_factor,
+            "sea_level_block": sea_level_y,
+            "min_y": min_build,
+            "max_y": max_build
+        }
+        
+        # Ensure water areas (below threshold) are capped at -1 block maximum (Y=61)
+        # This prevents shallow water from appearing as land at sea level (Y=62)
+        # Threshold is in meters, but data might be in blocks (if is_pre_scaled)
+        water_threshold = water_threshold_m
+        if is_pre_scaled:
+            # If pre-scaled, elevation data is in blocks, so we multiply threshold by 1/vertical_scale
+            # Actually, 1.0m threshold should become (1.0 / vertical_scale) blocks.
+            water_threshold = water_threshold_m / vertical_scale
+        
+        # Water is forced to be at least 1 block below the sea_level_y anchor, so its heightmap
+        # value is < the value for 0m. data is in current units: -1.0 blocks if is_pre_scaled,
+        # else -1.0 * vertical_scale meters, and never shallower than -1.0 units.
+        target_min_depth_in_units = -1.0 if is_pre_scaled else -1.0 * vertical_scale
+        water_floor = min(-1.0, target_min_depth_in_units)
+        
+        # Private (unshared) dataset handle, so nothing outlives this call in GDAL's dataset pool
+        with rasterio.Env(**geometry.GDAL_ENV_OPTIONS), rasterio.open(input_path, sharing=False) as src:
+            # Process in row strips so only one strip of elevation is held at a time
+            heightmap = np.empty((src.height, src.width), dtype=np.uint16)
+            n_water = 0
+            strips = (Window(0, row_off, src.width, min(TERRAIN_BLOCK_SIZE, src.height - row_off))
+                      for row_off in range(0, src.height, TERRAIN_BLOCK_SIZE))
+            for window, data in _prefetched(lambda w: src.read(1, window=w), strips):
+                # Clamp in place with one masked minimum (no gather/scatter of the water pixels)
+                water_mask = data < water_threshold
+                n_water += np.count_nonzero(water_mask)
+                np.minimum(data, water_floor, out=data, where=water_mask)
                 
-                log.info(f"Clamped {np.sum(water_mask)} water pixels (below {water_threshold:.3f}) to at least 1 block deep (Y=61)")
-            
-            # Clip to bounds
-            data = np.clip(data, calc_min_elev, calc_max_elev)
-            
-            # Normalize to 0-65535 map
-            # 0 = calc_min_elev, 65535 = calc_max_elev
-            span = calc_max_elev - calc_min_elev
-            if span == 0: span = 1
+                # Clip to bounds and normalize to 0-65535 map in one fused pass
+                # 0 = calc_min_elev, 65535 = calc_max_elev
+                heightmap[window.toslices()] = normalize_to_uint16(data, calc_min_elev, calc_max_elev)
             
-            normalized = ((data - calc_min_elev) / span * 65535).astype(np.uint16)
-            
-            meta = src.meta.copy()
-            meta.update(dtype=rasterio.uint16, nodata=None, driver='PNG')
-            
-            with rasterio.open(output_path, 'w', **meta) as dst:
-                dst.write(normalized, 1)
+            if n_water:
+                log.info(f"Clamped {n_water} water pixels (below {water_threshold:.3f}) to at least 1 block deep (Y=61)")
+        
+        # 16-bit grayscale PNG written by Pillow: WorldPainter needs no georeferencing, and a fast
+        # zlib level avoids GDAL's buffered single-threaded PNG CreateCopy at the default level
+        Image.fromarray(heightmap).save(output_path, format='PNG', compress_level=1)
                 
         # Write sidecar JSON for validation/reference (optional)
-        import json
-        sidecar = output_path + ".json"
-        with open(sidecar, 'w') as f:
-            json.dump({
-                "min_meters": calc_min_elev,
-                "max_meters": calc_max_elev,
-                "scale_factor_vertical": scale_factor,
-                "sea_level_block": sea_level_y,
-                "min_y": min_build,
-                "max_y": max_build
-            }, f, indent=2)
+        with open(output_path + ".json", 'w') as f: json.dump(sidecar, f, indent=2)
             
         log.info("Heightmap generated.")
 
@@ -1,10 +1,82 @@
+import os
 import shutil
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 log = logging.getLogger(__name__)
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows; files are then always copied
+    fcntl = None
+
+# Linux ioctl sharing a file's data extents with another (copy-on-write clone on btrfs/xfs/bcachefs)
+FICLONE = 0x40049409
+
+# Concurrent file copies when installing a world (file I/O releases the GIL), enough
+# to keep an SSD's queue full; scales with the machine, capped at 32
+INSTALL_COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def copy_file(src, dst):
+    ''' Drop-in for shutil.copy2 that first tries a copy-on-write clone, so installing onto the
+        same reflink-capable filesystem shares the region data instead of rewriting it.
+        Falls back to a regular copy on other filesystems, across devices, or off Linux.
+
+        :param str src: Source file
+        :param str dst: Destination file
+
+        :return: Destination path
+    '''
+    if fcntl is not None:
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return dst
+        except OSError:
+            pass
+    return shutil.copy2(src, dst)
+
+
+def dir_has_entries(path):
+    ''' Whether a directory exists and contains anything, stopping at the first entry.
+
+        :param Path path: Directory to check
+
+        :return: True if the directory exists and is not empty
+    '''
+    try:
+        with os.scandir(path) as entries: return next(entries, None) is not None
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+
+
+def copy_tree(source_dir, target_dir):
+    ''' Parallel equivalent of shutil.copytree(..., dirs_exist_ok=True) using copy_file.
+        The directory tree is created first, then the (many small) region files are copied
+        concurrently, and directory metadata is applied last, as copytree does.
+        Symlinked directories are followed and copied as real directories, also as copytree does.
+
+        :param Path source_dir: Directory to copy
+        :param Path target_dir: Destination directory (created if missing)
+    '''
+    dirs, files = [], []
+    for root, dirnames, filenames in os.walk(source_dir, followlinks=True):
+        rel = Path(root).relative_to(source_dir)
+        (target_dir / rel).mkdir(parents=True, exist_ok=True)
+        dirs.append(rel)
+        files.extend((Path(root) / name, target_dir / rel / name) for name in filenames)
+    
+    with ThreadPoolExecutor(max_workers=INSTALL_COPY_WORKERS) as executor:
+        # list() drains the iterator so the first copy error is raised here
+        list(executor.map(lambda pair: copy_file(*pair), files))
+    
+    # Deepest directories first, so setting a parent's mtime is not undone by its children
+    for rel in reversed(dirs): shutil.copystat(source_dir / rel, target_dir / rel)
+
 class WorldInstaller:
     def __init__(self, config={}):
         self.config = config
@@ -14,7 +86,6 @@ class WorldInstaller:
         
             :return: Path to Minecraft saves directory
         '''
-        import os
         # Allow override from config
         if 'saves_dir' in self.config['minecraft']:
             return Path(self.config['minecraft']['saves_dir'])
@@ -53,7 +124,7 @@ class WorldInstaller:
                     source_dir = sub
                     break
 
-        if target_dir.exists() and any(target_dir.iterdir()):
+        if dir_has_entries(target_dir):
             log.warning(f"Target directory already exists and is not empty: {target_dir}")
             try:
                 # Flush stdout to ensure prompt appears
@@ -72,7 +143,9 @@ class WorldInstaller:
                 raise
 
         try:
-            shutil.copytree(source_dir, target_dir, dirs_exist_ok=True)
+            # The export is a build target and Minecraft rewrites region files in place,
+            # so the world is never moved or hardlinked: files are cloned when possible, else copied
+            copy_tree(source_dir, target_dir)
             log.info(f"Successfully installed world to {target_dir}")
         except Exception as e:
             log.error(f"Error installing world: {e}")
@@ -0,0 +1,410 @@
+"""
+Numba-compiled raster kernels for map2craft.
+Fused single-pass versions of hot per-pixel loops used across the pipeline.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+from src.constants import BIOME_IDS
+
+# Biome IDs as module globals so numba folds them into compile-time constants
+_OCEAN = BIOME_IDS['ocean']
+_DEEP_OCEAN = BIOME_IDS['deep_ocean']
+_LUKEWARM_OCEAN = BIOME_IDS['lukewarm_ocean']
+_STONE_SHORE = BIOME_IDS['stone_shore']
+_BEACH = BIOME_IDS['beach']
+_MANGROVE_SWAMP = BIOME_IDS['mangrove_swamp']
+_PLAINS = BIOME_IDS['plains']
+
+# Sentinel for "no biome" entries in lookup tables (no biome uses ID 255)
+NO_BIOME = 255
+
+
+@njit(parallel=True, cache=True)
+def clamp_shallow(elev: np.ndarray, slope: np.ndarray, cliff_threshold: float):
+    ''' Force near-sea-level pixels to -1 in place (shallow flat land and shallow water).
+    
+        :param np.ndarray elev: 2D elevation array (modified in place)
+        :param np.ndarray slope: 2D slope array in degrees
+        :param float cliff_threshold: Slope above which shallow land is left untouched
+        
+        :return: (clamped_land, clamped_water) pixel counts
+    '''
+    height, width = elev.shape
+    n_land = 0
+    n_water = 0
+    for r in prange(height):
+        for c in range(width):
+            e = elev[r, c]
+            if 0.0 < e < 1.0 and slope[r, c] < cliff_threshold:
+                elev[r, c] = -1.0
+                n_land += 1
+            elif -1.0 < e < 0.0:
+                elev[r, c] = -1.0
+                n_water += 1
+    return n_land, n_water
+
+
+@njit(parallel=True, cache=True)
+def fix_coastline(elev: np.ndarray, land_mask: np.ndarray):
+    ''' Snap elevation to the side of sea level given by a land mask, in place.
+    
+        Land (mask 1) below 0 becomes 0.01; water (mask 0) at or above 0 becomes -0.01.
+        
+        :param np.ndarray elev: 2D elevation array (modified in place)
+        :param np.ndarray land_mask: 2D uint8 land mask (1 = land, 0 = water)
+    '''
+    height, width = elev.shape
+    for r in prange(height):
+        for c in range(width):
+            e = elev[r, c]
+            m = land_mask[r, c]
+            if m == 1 and e < 0.0:
+                elev[r, c] = 0.01
+            elif m == 0 and e >= 0.0:
+                elev[r, c] = -0.01
+
+
+@njit(parallel=True, cache=True)
+def fix_ringing(elev: np.ndarray, water_mask: np.ndarray, max_bump: float) -> int:
+    ''' Push small positive cubic-ringing bumps over source water below sea level, in place.
+    
+        Pixels with water_mask 1 and 0 < elev < max_bump become -0.1.
+        
+        :param np.ndarray elev: 2D elevation array (modified in place)
+        :param np.ndarray water_mask: 2D uint8 source-water mask (1 = water)
+        :param float max_bump: Largest positive value treated as an artifact
+        
+        :return: Number of pixels fixed
+    '''
+    height, width = elev.shape
+    n_fixed = 0
+    for r in prange(height):
+        for c in range(width):
+            e = elev[r, c]
+            if water_mask[r, c] == 1 and 0.0 < e < max_bump:
+                elev[r, c] = -0.1
+                n_fixed += 1
+    return n_fixed
+
+
+@njit(parallel=True, cache=True)
+def normalize_to_uint16(data: np.ndarray, min_value: float, max_value: float) -> np.ndarray:
+    ''' Clip to [min_value, max_value] and map linearly onto 0-65535, in one pass.
+    
+        Arithmetic stays in float32 so results match the numpy clip/scale/astype chain.
+        
+        :param np.ndarray data: 2D float32 array
+        :param float min_value: Value mapped to 0
+        :param float max_value: Value mapped to 65535
+        
+        :return: 2D uint16 array
+    '''
+    lo = np.float32(min_value)
+    hi = np.float32(max_value)
+    span = np.float32(max_value - min_value)
+    if span == 0: span = np.float32(1.0)
+    full = np.float32(65535.0)
+    
+    height, width = data.shape
+    out = np.empty((height, width), dtype=np.uint16)
+    for r in prange(height):
+        for c in range(width):
+            v = data[r, c]
+            if v < lo:
+                v = lo
+            elif v > hi:
+                v = hi
+            out[r, c] = np.uint16((v - lo) / span * full)
+    return out
+
+
+@njit(parallel=True, cache=True)
+def gradient_magnitude(elev: np.ndarray, z_scale, spacing_y, spacing_x) -> np.ndarray:
+    ''' Gradient magnitude sqrt(dx² + dy²) from central differences (one-sided at the borders, like np.gradient).
+    
+        Samples are multiplied by z_scale as they are read, exactly as a pre-scaled array would hold them.
+        Scale and spacings are passed in the elevation dtype so the arithmetic runs at the same precision
+        as the numpy expression it replaces. The arctan is left to numpy: its SIMD float32 arctan
+        rounds differently from libm on some inputs.
+        
+        :param np.ndarray elev: 2D float elevation array, at least 2x2
+        :param z_scale: Factor converting elevation samples to meters
+        :param spacing_y: Pixel spacing along rows
+        :param spacing_x: Pixel spacing along columns
+        
+        :return: 2D gradient magnitude array (same dtype as elev)
+    '''
+    height, width = elev.shape
+    two_sy = spacing_y + spacing_y
+    two_sx = spacing_x + spacing_x
+    out = np.empty_like(elev)
+    for r in prange(height):
+        for c in range(width):
+            if r == 0:
+                dy = (elev[1, c] * z_scale - elev[0, c] * z_scale) / spacing_y
+            elif r == height - 1:
+                dy = (elev[r, c] * z_scale - elev[r - 1, c] * z_scale) / spacing_y
+            else:
+                dy = (elev[r + 1, c] * z_scale - elev[r - 1, c] * z_scale) / two_sy
+            if c == 0:
+                dx = (elev[r, 1] * z_scale - elev[r, 0] * z_scale) / spacing_x
+            elif c == width - 1:
+                dx = (elev[r, c] * z_scale - elev[r, c - 1] * z_scale) / spacing_x
+            else:
+                dx = (elev[r, c + 1] * z_scale - elev[r, c - 1] * z_scale) / two_sx
+            out[r, c] = np.sqrt(dx * dx + dy * dy)
+    return out
+
+
+@njit(parallel=True, cache=True)
+def slope_to_uint8(slope: np.ndarray, max_slope) -> np.ndarray:
+    ''' Slope mapped onto 0-255 (max_slope and steeper = 255) in one pass.
+    
+        Matches the numpy clip(slope / max_slope * 255, 0, 255).astype(uint8) chain, with NaN mapped to 0.
+        
+        :param np.ndarray slope: 2D slope array in degrees
+        :param max_slope: Slope in degrees mapped to 255, in the slope dtype
+        
+        :return: 2D uint8 array
+    '''
+    height, width = slope.shape
+    full = slope.dtype.type(255)
+    out = np.empty((height, width), dtype=np.uint8)
+    for r in prange(height):
+        for c in range(width):
+            v = slope[r, c] / max_slope * full
+            if v >= full:
+                out[r, c] = 255
+            elif v > 0:
+                out[r, c] = np.uint8(v)
+            else:
+                out[r, c] = 0
+    return out
+
+
+@njit(parallel=True, cache=True)
+def water_mask_u8(elev: np.ndarray, z_scale, sea_level) -> np.ndarray:
+    ''' 255 where elev * z_scale <= sea_level, else 0 (NaN counts as land), in one pass.
+    
+        :param np.ndarray elev: 2D float elevation array
+        :param z_scale: Factor converting elevation samples to meters, in the elevation dtype
+        :param sea_level: Water threshold in meters, in the elevation dtype
+        
+        :return: 2D uint8 array
+    '''
+    height, width = elev.shape
+    out = np.empty((height, width), dtype=np.uint8)
+    for r in prange(height):
+        for c in range(width):
+            out[r, c] = 255 if elev[r, c] * z_scale <= sea_level else 0
+    return out
+
+
+@njit(parallel=True, cache=True)
+def seabed_cover_u8(elev: np.ndarray, inland: np.ndarray, slope: np.ndarray, gravel_min, rock_min) -> np.ndarray:
+    ''' RGB seabed classes (sand, gravel, rock) for sea pixels (elev < 0 and not inland), in one pass.
+    
+        :param np.ndarray elev: 2D elevation array in meters
+        :param np.ndarray inland: 2D bool inland water mask (excluded from seabed cover)
+        :param np.ndarray slope: 2D slope in degrees
+        :param gravel_min: Minimum slope for gravel, in the slope dtype
+        :param rock_min: Minimum slope for rock, in the slope dtype
+        
+        :return: 3D uint8 array (H, W, 3)
+    '''
+    height, width = elev.shape
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    for r in prange(height):
+        for c in range(width):
+            if elev[r, c] < 0 and not inland[r, c]:
+                s = slope[r, c]
+                out[r, c, 0] = 255
+                out[r, c, 1] = 255 if s >= gravel_min else 0
+                out[r, c, 2] = 255 if s >= rock_min else 0
+            else:
+                out[r, c, 0] = 0
+                out[r, c, 1] = 0
+                out[r, c, 2] = 0
+    return out
+
+
+@njit(parallel=True, cache=True)
+def max_ignoring(data: np.ndarray, nodata: float, has_nodata: bool) -> float:
+    ''' Maximum of a 2D array skipping nodata (and NaN) values, without a masked copy.
+    
+        :param np.ndarray data: 2D array
+        :param float nodata: Value to skip (ignored unless has_nodata)
+        :param bool has_nodata: Whether nodata applies
+        
+        :return: Maximum valid value, or -inf if there is none
+    '''
+    height, width = data.shape
+    row_max = np.full(height, -np.inf)
+    for r in prange(height):
+        m = -np.inf
+        for c in range(width):
+            v = data[r, c]
+            if has_nodata and v == nodata: continue
+            if v > m: m = v
+        row_max[r] = m
+    return row_max.max() if height else -np.inf
+
+
+@njit(parallel=True, cache=True)
+def elevation_stats(elev: np.ndarray, z_scale):
+    ''' Min, max and sum of elev * z_scale with NaN counted as 0, in one pass.
+    
+        :param np.ndarray elev: 2D float elevation array
+        :param z_scale: Factor converting elevation samples to meters, in the elevation dtype
+        
+        :return: (min, max, sum), the sum accumulated in float64
+    '''
+    height, width = elev.shape
+    row_min = np.empty(height)
+    row_max = np.empty(height)
+    row_sum = np.empty(height)
+    for r in prange(height):
+        lo, hi, total = np.inf, -np.inf, 0.0
+        for c in range(width):
+            v = elev[r, c] * z_scale
+            if np.isnan(v): v = 0.0
+            if v < lo: lo = v
+            if v > hi: hi = v
+            total += v
+        row_min[r] = lo
+        row_max[r] = hi
+        row_sum[r] = total
+    return row_min.min(), row_max.max(), row_sum.sum()
+
+
+@njit(parallel=True, cache=True)
+def classify_biomes(is_water: np.ndarray, is_inland: np.ndarray, elev: np.ndarray, slope: np.ndarray,
+                    land_cover: np.ndarray, land_cover_lut: np.ndarray, beach: np.ndarray,
+                    has_land_cover: bool, has_beach: bool,
+                    cliff_threshold: float, lukewarm_depth: float, deep_depth: float) -> np.ndarray:
+    ''' Assign a biome ID per pixel following the classification priority ladder.
+    
+        Ocean depths -> stone shore -> beach -> land cover -> inland swamp -> plains.
+        Land cover classes map to biomes through the 256-entry ``land_cover_lut`` (NO_BIOME = no match).
+        ``land_cover`` and ``beach`` are ignored (and may be empty) when their flags are False.
+        
+        :return: 2D uint8 biome ID array
+    '''
+    height, width = elev.shape
+    out = np.empty((height, width), dtype=np.uint8)
+    for r in prange(height):
+        for c in range(width):
+            if is_water[r, c] and not is_inland[r, c]:
+                e = elev[r, c]
+                if e < deep_depth: out[r, c] = _DEEP_OCEAN
+                elif e > lukewarm_depth: out[r, c] = _LUKEWARM_OCEAN
+                else: out[r, c] = _OCEAN
+                continue
+            if not is_water[r, c]:
+                if slope[r, c] >= cliff_threshold:
+                    out[r, c] = _STONE_SHORE
+                    continue
+                if has_beach and beach[r, c]:
+                    out[r, c] = _BEACH
+                    continue
+                if has_land_cover:
+                    lc_biome = land_cover_lut[land_cover[r, c]]
+                    if lc_biome != NO_BIOME:
+                        out[r, c] = lc_biome
+                        continue
+            out[r, c] = _MANGROVE_SWAMP if is_inland[r, c] else _PLAINS
+    return out
+
+
+@njit(parallel=True, cache=True)
+def bounded_edt(mask: np.ndarray, cutoff: float) -> np.ndarray:
+    ''' Euclidean distance from each True pixel to the nearest False pixel, exact up to ``cutoff``.
+    
+        Vertical distances are swept per column (capped just past the cutoff), then each row
+        only searches offsets within the cutoff. Pixels farther than ``cutoff`` get ``cutoff + 1``.
+        
+        :param np.ndarray mask: 2D boolean array (False = feature pixels to measure distance to)
+        :param float cutoff: Maximum distance of interest in pixels
+        
+        :return: 2D float64 distance array in pixels
+    '''
+    height, width = mask.shape
+    k = int(np.floor(cutoff)) + 1
+    
+    # 1. Column distance to the nearest False pixel, capped at k (column chunks keep rows contiguous)
+    g = np.empty((height, width), dtype=np.int32)
+    for chunk in prange((width + 63) // 64):
+        c0 = chunk * 64
+        c1 = min(c0 + 64, width)
+        for r in range(height):
+            for c in range(c0, c1):
+                if not mask[r, c]: g[r, c] = 0
+                elif r > 0 and g[r - 1, c] < k: g[r, c] = g[r - 1, c] + 1
+                else: g[r, c] = k
+        for r in range(height - 2, -1, -1):
+            for c in range(c0, c1):
+                if g[r + 1, c] + 1 < g[r, c]: g[r, c] = g[r + 1, c] + 1
+    
+    # 2. Row pass: nearest squared distance among columns within the cutoff
+    out = np.empty((height, width), dtype=np.float64)
+    limit = cutoff * cutoff
+    for r in prange(height):
+        for c in range(width):
+            best = k * k
+            for cc in range(max(c - k + 1, 0), min(c + k, width)):
+                gv = g[r, cc]
+                if gv < k:
+                    d2 = (cc - c) * (cc - c) + gv * gv
+                    if d2 < best: best = d2
+            out[r, c] = np.sqrt(best) if best <= limit else cutoff + 1.0
+    return out
+
+
+@njit(cache=True)
+def border_connected(mask: np.ndarray) -> np.ndarray:
+    ''' True pixels 4-connected to the raster border, by a flood fill seeded from every True border pixel.
+    
+        Equivalent to labeling the mask and keeping the labels seen on the border, without the
+        full label array or a pass over the interior blobs that never touch the border.
+        
+        :param np.ndarray mask: 2D boolean array
+        
+        :return: 2D boolean array
+    '''
+    height, width = mask.shape
+    out = np.zeros((height, width), dtype=np.bool_)
+    # Explicit stack of flat indices (each pixel is pushed at most once), grown on demand
+    stack = np.empty(max(1024, 2 * (height + width)), dtype=np.int64)
+    top = 0
+    
+    # Seed with the True border pixels (marked when pushed, so corners are pushed once)
+    for r in range(height):
+        for c in (0, width - 1):
+            if mask[r, c] and not out[r, c]:
+                out[r, c] = True
+                stack[top] = r * width + c
+                top += 1
+    for c in range(width):
+        for r in (0, height - 1):
+            if mask[r, c] and not out[r, c]:
+                out[r, c] = True
+                stack[top] = r * width + c
+                top += 1
+    
+    while top > 0:
+        top -= 1
+        r, c = divmod(stack[top], width)
+        for k in range(4):
+            rr = r + (-1, 1, 0, 0)[k]
+            cc = c + (0, 0, -1, 1)[k]
+            if 0 <= rr < height and 0 <= cc < width and mask[rr, cc] and not out[rr, cc]:
+                out[rr, cc] = True
+                if top == stack.size:
+                    grown = np.empty(stack.size * 2, dtype=np.int64)
+                    grown[:top] = stack[:top]
+                    stack = grown
+                stack[top] = rr * width + cc
+                top += 1
+    return out
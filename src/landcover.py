@@ -7,15 +7,26 @@ import logging
 import numpy as np
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
-import requests
 from pathlib import Path
 from rasterio.merge import merge
-from rasterio.windows import from_bounds as window_from_bounds
-from typing import Optional, Tuple, List
+from typing import Tuple
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from src import geometry
 
 log = logging.getLogger(__name__)
 
+# Concurrent WorldCover COG opens (each one is a latency-bound header fetch)
+COG_OPEN_WORKERS = 8
+# GDAL config for reading remote COGs: no sibling-file listing, cached ranged reads,
+# HTTP/2 multiplexing where the server offers it, and multithreaded decoding
+COG_ENV_OPTIONS = dict(
+    GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR', VSI_CACHE='TRUE',
+    GDAL_HTTP_MULTIPLEX='YES', GDAL_HTTP_VERSION='2', GDAL_NUM_THREADS='ALL_CPUS'
+)
+
 LAND_COVER_NAMES = {
     10: "Tree cover",
     20: "Shrubland",
@@ -30,6 +41,23 @@ LAND_COVER_NAMES = {
     100: "Moss and lichen",
 }
 
+@lru_cache(maxsize=1)
+def _stac_catalog():
+    ''' Planetary Computer STAC client (signing asset hrefs), built once per process. '''
+    import pystac_client
+    import planetary_computer
+    
+    return pystac_client.Client.open(
+        "https://planetarycomputer.microsoft.com/api/stac/v1",
+        modifier=planetary_computer.sign_inplace,
+    )
+
+
+def _item_year(item) -> int:
+    ''' Year a STAC item covers (WorldCover items carry a start/end range instead of a datetime). '''
+    return (item.datetime or item.common_metadata.start_datetime).year
+
+
 class LandCoverProcessor:
     def __init__(self, config=None):
         self.config = config or {}
@@ -52,93 +80,102 @@ class LandCoverProcessor:
         log.info(f"Downloading latest land cover from Microsoft Planetary Computer...")
         
         try:
-            import pystac_client
-            import planetary_computer
+            catalog = _stac_catalog()
             
-            catalog = pystac_client.Client.open(
-                "https://planetarycomputer.microsoft.com/api/stac/v1",
-                modifier=planetary_computer.sign_inplace,
+            # One search over every candidate year (2020 up to the current year, inclusive);
+            # the newest year with coverage wins
+            log.debug(f"Searching WorldCover data in 2020-{current_year}...")
+            search = catalog.search(
+                collections=["esa-worldcover"],
+                bbox=[lon_min, lat_min, lon_max, lat_max],
+                datetime=f"2020-01-01/{current_year}-12-31",
             )
+            results = list(search.items())
             
-            # Search for available years starting from current year down to 2020
-            items = []
-            final_year = None
-            
-            for year in range(current_year, 2019, -1): # Search from current year down to 2020 (inclusive)
-                query_year = str(year)
-                log.debug(f"Checking for WorldCover data in {query_year}...")
-                
-                search = catalog.search(
-                    collections=["esa-worldcover"],
-                    bbox=[lon_min, lat_min, lon_max, lat_max],
-                    datetime=f"{query_year}-01-01/{query_year}-12-31",
-                )
-                
-                results = list(search.items())
-                if results:
-                    items = results
-                    final_year = query_year
-                    break
-            
-            if not items:
+            if not results:
                 log.warning(f"  [✗] No WorldCover data found in range 2020-{current_year}")
                 return False
 
+            final_year = max(_item_year(item) for item in results)
+            items = [item for item in results if _item_year(item) == final_year]
+
             log.info(f"  [✓] Found {len(items)} tiles for year {final_year}")
             
-            sources = []
+            hrefs = []
             for item in items:
                 asset = item.assets.get("map")
                 if asset:
-                    href = asset.href
                     log.info(f"    - Opening: {item.id}")
-                    src = rasterio.open(href)
-                    sources.append(src)
+                    hrefs.append(asset.href)
                     
-            if not sources:
+            if not hrefs:
                 log.error("  [✗] No valid map assets found")
                 return False
 
-            log.info(f"  Merging {len(sources)} tile(s)...")
-            mosaic, mosaic_transform = merge(sources, bounds=(lon_min, lat_min, lon_max, lat_max))
-            
-            for src in sources: src.close()
+            # Merge straight to a temporary GeoTIFF instead of one in-memory mosaic
+            # (rasterio >= 1.4 writes dst_path in chunks within merge's default 64 MB mem_limit)
+            mosaic_file = Path(output_file).with_suffix('.mosaic.tif')
+            try:
+                with rasterio.Env(**COG_ENV_OPTIONS), ExitStack() as stack:
+                    # Each open fetches a COG header over HTTP, so overlap the round trips.
+                    # Every handle registers its close() as it opens, so all of them are closed even
+                    # if another open or the merge fails (the pool waits for every open first).
+                    # close() rather than the dataset's own __exit__, which must run on the opening thread
+                    def open_cog(href):
+                        src = rasterio.open(href)
+                        stack.callback(src.close)
+                        return src
+                    
+                    with ThreadPoolExecutor(max_workers=min(COG_OPEN_WORKERS, len(hrefs))) as executor:
+                        sources = list(executor.map(open_cog, hrefs))
+                    
+                    log.info(f"  Merging {len(sources)} tile(s)...")
+                    merge(
+                        sources, bounds=(lon_min, lat_min, lon_max, lat_max),
+                        dst_path=mosaic_file, dst_kwds=dict(driver='GTiff', tiled=True, compress='lzw')
+                    )
 
-            log.info(f"  Reprojecting to {target_crs} at {resolution}m resolution...")
-            
-            # 1. Calculate the new transform and dimensions
-            dst_transform, dst_width, dst_height = calculate_default_transform(
-                'EPSG:4326', target_crs, mosaic.shape[2], mosaic.shape[1], 
-                *bounds, resolution=resolution
-            )
-            
-            # 2. Resample using Nearest Neighbor to preserve categorical labels
-            reprojected = np.zeros((dst_height, dst_width), dtype=mosaic.dtype)
-            
-            reproject(
-                source=mosaic[0],
-                destination=reprojected,
-                src_transform=mosaic_transform,
-                src_crs='EPSG:4326',
-                dst_transform=dst_transform,
-                dst_crs=target_crs,
-                resampling=Resampling.nearest
-            )
+                log.info(f"  Reprojecting to {target_crs} at {resolution}m resolution...")
+                
+                with rasterio.open(mosaic_file) as mosaic:
+                    # 1. Calculate the new transform and dimensions
+                    dst_transform, dst_width, dst_height = calculate_default_transform(
+                        'EPSG:4326', target_crs, mosaic.width, mosaic.height, 
+                        *bounds, resolution=resolution
+                    )
+                    
+                    # 2. Resample using Nearest Neighbor to preserve categorical labels
+                    # Uninitialized buffer: the warper fills pixels outside the mosaic with nodata (0) itself
+                    dtype = mosaic.dtypes[0]
+                    reprojected = np.empty((dst_height, dst_width), dtype=dtype)
+                    
+                    reproject(
+                        source=rasterio.band(mosaic, 1),
+                        destination=reprojected,
+                        src_transform=mosaic.transform,
+                        src_crs='EPSG:4326',
+                        dst_transform=dst_transform,
+                        dst_crs=target_crs,
+                        resampling=Resampling.nearest,
+                        dst_nodata=0,
+                        **geometry.WARP_OPTIONS
+                    )
+            finally:
+                mosaic_file.unlink(missing_ok=True)
 
             log.info(f"  Saving reprojected land cover...")
             
             with rasterio.open(
                 output_file,
                 'w',
-                driver='GTiff',
                 height=dst_height,
                 width=dst_width,
                 count=1,
-                dtype=mosaic.dtype,
+                dtype=dtype,
                 crs=target_crs,
                 transform=dst_transform,
-                compress='lzw',
                 nodata=0,
+                **geometry.BYTE_GTIFF_OPTIONS
             ) as dst: dst.write(reprojected, 1)
                 
             log.info(f"  [✓] Land cover saved: {output_file}")
@@ -155,17 +192,22 @@ class LandCoverProcessor:
         
             :param str land_cover_file: Path to land cover GeoTIFF
         '''
+        # WorldCover classes are small uint8 codes: a histogram avoids np.unique's sort,
+        # and accumulating it block by block avoids reading the whole raster at once
+        counts = np.zeros(256, dtype=np.int64)
         with rasterio.open(land_cover_file) as src:
-            data = src.read(1)
+            width, height = src.width, src.height
+            for _, window in src.block_windows(1):
+                counts += np.bincount(src.read(1, window=window).ravel(), minlength=counts.size)
             
         log.info(f"\nLand cover distribution:")
-        log.info(f"  Size: {data.shape[1]} x {data.shape[0]} pixels")
-        
-        unique, counts = np.unique(data, return_counts=True)
+        log.info(f"  Size: {width} x {height} pixels")
         
-        for value, count in zip(unique, counts):
-            name = LAND_COVER_NAMES.get(int(value), f"Unknown ({int(value)})")
-            percentage = (count / data.size) * 100
+        total = width * height
+        for value in np.flatnonzero(counts).tolist():
+            count = counts[value]
+            name = LAND_COVER_NAMES.get(value, f"Unknown ({value})")
+            percentage = (count / total) * 100
             log.info(f"  {name}: {percentage:.1f}%")
 
     def download_land_cover_action(self, target, source, env):
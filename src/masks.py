@@ -3,30 +3,92 @@
 from pathlib import Path
 import numpy as np
 import rasterio
+from rasterio.windows import Window
 from PIL import Image
 from typing import Tuple
 import logging
 from scipy import ndimage
 
+try:
+    import cv2
+except ImportError:  # OpenCV is optional; scipy.ndimage is the fallback morphology backend
+    cv2 = None
+
 from . import geometry
+from .kernels import border_connected, seabed_cover_u8, slope_to_uint8, water_mask_u8
 
 log = logging.getLogger(__name__)
 
-from . import geometry
+# Rows of elevation read per strip by the pointwise/stencil masks
+MASK_STRIP_ROWS = 512
+
+# zlib level for mask PNGs: intermediate build artifacts, so encode speed beats file size
+MASK_PNG_COMPRESS_LEVEL = 1
+
+
+def _erode_square(mask: np.ndarray, kernel_size: int) -> np.ndarray:
+    ''' Binary erosion with a square kernel, treating outside the map as True. '''
+    if cv2 is not None:
+        kernel = np.ones((kernel_size, kernel_size), dtype=np.uint8)
+        return cv2.erode(mask.view(np.uint8), kernel, borderType=cv2.BORDER_CONSTANT, borderValue=1).view(bool)
+    # Grey-level erosion of the 0/1 mask: a separable running minimum whose cost doesn't grow with
+    # the kernel, with the same centering (and result) as binary_erosion with a square structure
+    return ndimage.grey_erosion(mask.view(np.uint8), size=(kernel_size, kernel_size), mode='constant', cval=1).view(bool)
+
+
+def _dilate_square(mask: np.ndarray, kernel_size: int) -> np.ndarray:
+    ''' Binary dilation with a square kernel, treating outside the map as True. '''
+    if cv2 is not None:
+        # ndimage reflects the structure for dilation, so even kernels anchor one pixel earlier
+        kernel = np.ones((kernel_size, kernel_size), dtype=np.uint8)
+        anchor = ((kernel_size - 1) // 2, (kernel_size - 1) // 2)
+        return cv2.dilate(mask.view(np.uint8), kernel, anchor=anchor,
+                          borderType=cv2.BORDER_CONSTANT, borderValue=1).view(bool)
+    # Grey-level dilation reflects even-sized windows exactly like binary_dilation does
+    return ndimage.grey_dilation(mask.view(np.uint8), size=(kernel_size, kernel_size), mode='constant', cval=1).view(bool)
+
 
 class MaskGenerator:
     def __init__(self, config=None):
         self.config = config or {}
 
-    def generate_water_mask(self, elevation: np.ndarray, sea_level: float = 0.0) -> np.ndarray:
+    def _elevation_strips(self, src, halo: int = 0, dtype=np.float32):
+        ''' Yield row strips of elevation, so masks never hold the full raster at once.
+        
+            :param src: Open rasterio dataset
+            :param int halo: Extra rows read above and below each strip (clipped at the raster edges)
+            :param dtype: Dtype to decode into (None keeps the raster's own dtype)
+            
+            :return: Iterator of (row slice of the strip, elevation including its halo rows)
+        '''
+        for row_off in range(0, src.height, MASK_STRIP_ROWS):
+            rows = slice(row_off, min(row_off + MASK_STRIP_ROWS, src.height))
+            h0, h1 = max(rows.start - halo, 0), min(rows.stop + halo, src.height)
+            yield rows, src.read(1, window=Window(0, h0, src.width, h1 - h0), out_dtype=dtype)
+
+    def _elevation_scale(self, is_pre_scaled: bool) -> float:
+        ''' Factor converting stored elevation to meters (blocks -> meters when pre-scaled). '''
+        return float(self.config['minecraft']['scale']['vertical']) if is_pre_scaled else 1.0
+
+    def generate_water_mask(self, elevation: np.ndarray, sea_level: float = 0.0, z_scale: float = 1.0) -> np.ndarray:
         ''' Generate a water mask based on elevation.
             
             :param np.ndarray elevation: 2D numpy array of elevation values
             :param float sea_level: Sea level in meters (default 0)
+            :param float z_scale: Factor converting elevation to meters, applied per pixel (default 1)
             
             :return: 2D numpy array: 255 for water, 0 for land
         '''
-        water_mask = (elevation <= sea_level).astype(np.uint8) * 255
+        # Scaled float input: multiply and compare per pixel in one kernel pass
+        if z_scale != 1.0 and elevation.ndim == 2 and elevation.dtype.kind == 'f':
+            as_dtype = elevation.dtype.type
+            return water_mask_u8(elevation, as_dtype(z_scale), as_dtype(sea_level))
+        if z_scale != 1.0: elevation = elevation * z_scale
+        
+        # Comparison written straight into the uint8 buffer (as 0/1), then scaled in place
+        water_mask = np.empty(elevation.shape, dtype=np.uint8)
+        np.less_equal(elevation, sea_level, out=water_mask.view(bool))
+        water_mask *= 255
         return water_mask
 
 
@@ -49,48 +111,37 @@ class MaskGenerator:
 
         # 1. Erode to sever connections
         # Larger kernel = wider channels are severed
-        # border_value=1 ensures we don't erode away from the map edge (treat outside as water)
-        structure = np.ones((kernel_size, kernel_size), dtype=int)
-        eroded_water = ndimage.binary_erosion(is_water, structure=structure, border_value=1)
-        
-        # 2. Label eroded components
-        # Use 4-connectivity for labeling to stop diagonal leaks
-        label_structure = np.array([[0,1,0], [1,1,1], [0,1,0]], dtype=int)
-        labeled_array, num_features = ndimage.label(eroded_water, structure=label_structure)
+        # Outside the map counts as water so we don't erode away from the map edge
+        eroded_water = _erode_square(is_water, kernel_size)
         
-        # 3. Identify Main Ocean Core (touching borders)
-        border_mask = np.zeros_like(labeled_array, dtype=bool)
-        border_mask[0, :] = True
-        border_mask[-1, :] = True
-        border_mask[:, 0] = True
-        border_mask[:, -1] = True
-        
-        ocean_labels = np.unique(labeled_array[border_mask & (labeled_array > 0)])
-        is_main_ocean_core = np.isin(labeled_array, ocean_labels)
+        # 2-3. Main Ocean Core: eroded water 4-connected to the map border
+        # (4-connectivity stops diagonal leaks), found by a flood fill seeded from the border
+        is_main_ocean_core = border_connected(eroded_water)
         
         # 4. Restore Main Ocean (Dilate back)
         # We dilate the CORE, not the whole mask. This restores the ocean coast
         # but does NOT reconnect to the inland bodies (because they were severed).
-        # border_value=1 matches erosion behavior
-        restored_ocean = ndimage.binary_dilation(is_main_ocean_core, structure=structure, border_value=1)
+        # Outside the map counts as water, matching erosion behavior
+        restored_ocean = _dilate_square(is_main_ocean_core, kernel_size)
         
         # 5. Inland Water is any water that isn't part of the restored ocean
         return is_water & ~restored_ocean
 
 
     def generate_slope_mask(self, elevation: np.ndarray, pixel_size: Tuple[float, float], 
-                           max_slope: float = 60.0) -> np.ndarray:
+                           max_slope: float = 60.0, z_scale: float = 1.0) -> np.ndarray:
         ''' Generate a slope mask from elevation data.
             
             :param np.ndarray elevation: 2D numpy array of elevation values
             :param Tuple[float, float] pixel_size: (px_meters, py_meters) pixel size in meters
             :param float max_slope: Maximum slope in degrees for normalization
+            :param float z_scale: Factor converting elevation to meters, applied per pixel (default 1)
             
             :return: 2D numpy array: 0-255 slope intensity
         '''
-        slope = geometry.compute_slope_degrees(elevation, pixel_size)
-        normalized = np.clip(slope / max_slope * 255, 0, 255).astype(np.uint8)
-        return normalized
+        # Scale and slope in one stencil pass, then clip/scale/cast in one more
+        slope = geometry.compute_slope_degrees(elevation, pixel_size, z_scale)
+        return slope_to_uint8(slope, slope.dtype.type(max_slope))
 
 
     def create_water_mask(self, elevation_file: str, output_file: str, sea_level: float = 0.0, 
@@ -103,16 +154,20 @@ class MaskGenerator:
             :param bool is_pre_scaled: If True, input is in blocks
         ''' 
         with rasterio.open(elevation_file) as src:
-            elevation = src.read(1).astype(np.float32)
+            water_mask = np.empty(src.shape, dtype=np.uint8)
+            z_scale = self._elevation_scale(is_pre_scaled)
             
-            if is_pre_scaled:
-                v_scale = float(self.config['minecraft']['scale']['vertical'])
-                elevation *= v_scale
-                
-            water_mask = self.generate_water_mask(elevation, sea_level)
+            # Unscaled 8/16-bit integer DEMs are compared in their own dtype against the float32
+            # threshold: float32 holds every such value exactly, so nothing needs widening
+            threshold, dtype = sea_level, np.float32
+            if not is_pre_scaled and np.dtype(src.dtypes[0]).kind in 'iu' and np.dtype(src.dtypes[0]).itemsize <= 2:
+                threshold, dtype = np.float32(sea_level), None
+            
+            for rows, elevation in self._elevation_strips(src, dtype=dtype):
+                water_mask[rows] = self.generate_water_mask(elevation, threshold, z_scale)
             
             img = Image.fromarray(water_mask, mode='L')
-            img.save(output_file)
+            img.save(output_file, compress_level=MASK_PNG_COMPRESS_LEVEL)
         
         log.info(f"[✓] Water mask saved: {output_file}")
 
@@ -127,16 +182,17 @@ class MaskGenerator:
             :param bool is_pre_scaled: If True, input is in blocks
         '''
         with rasterio.open(elevation_file) as src:
-            elevation = src.read(1).astype(np.float32)
+            pixel_size = geometry.compute_pixel_size_meters(src.transform, src.crs, src.shape)
             
-            if is_pre_scaled:
-                v_scale = float(self.config['minecraft']['scale']['vertical'])
-                elevation *= v_scale
-            
-            pixel_size = geometry.compute_pixel_size_meters(src.transform, src.crs, elevation.shape)
-            slope_mask = self.generate_slope_mask(elevation, pixel_size, max_slope)
+            # One halo row on each side keeps the slope stencil central across strip seams
+            slope_mask = np.empty(src.shape, dtype=np.uint8)
+            z_scale = self._elevation_scale(is_pre_scaled)
+            for rows, elevation in self._elevation_strips(src, halo=1):
+                top = 1 if rows.start > 0 else 0
+                strip = self.generate_slope_mask(elevation, pixel_size, max_slope, z_scale)
+                slope_mask[rows] = strip[top:top + rows.stop - rows.start]
             
-            Image.fromarray(slope_mask, mode='L').save(output_file)
+            Image.fromarray(slope_mask, mode='L').save(output_file, compress_level=MASK_PNG_COMPRESS_LEVEL)
         
         log.info(f"[✓] Slope mask saved: {output_file}")
 
@@ -161,30 +217,16 @@ class MaskGenerator:
         # Compute slope in degrees (using meters)
         slope = geometry.compute_slope_degrees(elevation, pixel_size)
         
-        # Water mask (only classify underwater areas)
-        water_mask = elevation < 0.0
-        
         # Inland Water Exclusion
         # Detect inland water and mask it out (seabed type 0 / None)
         inland_water_mask = self.detect_inland_water(elevation, sea_level, kernel_size=erosion_kernel_size)
-    
-        # Initialize 3-channel mask (RGB)
-        height, width = elevation.shape
-        seabed_mask = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Apply mask only where it is NOT inland water
-        valid_water_mask = water_mask & ~inland_water_mask
-
-        # Sand (channel 0 - Red): Default for all valid underwater areas
-        seabed_mask[:, :, 0][valid_water_mask] = 255
-        
-        # Gravel (channel 1 - Green): Areas with slope >= gravel_min_degrees
-        gravel_mask = valid_water_mask & (slope >= gravel_min_degrees)
-        seabed_mask[:, :, 1][gravel_mask] = 255
         
-        # Rock (channel 2 - Blue): Areas with slope >= rock_min_degrees
-        rock_mask = valid_water_mask & (slope >= rock_min_degrees)
-        seabed_mask[:, :, 2][rock_mask] = 255
+        # Underwater (elevation < 0), non-inland pixels get sand (R); gravel (G) and rock (B)
+        # where the slope reaches their minimum, all three channels written in a single pass
+        as_dtype = slope.dtype.type
+        seabed_mask = seabed_cover_u8(
+            elevation, inland_water_mask, slope, as_dtype(gravel_min_degrees), as_dtype(rock_min_degrees)
+        )
         
         return seabed_mask
 
@@ -202,7 +244,9 @@ class MaskGenerator:
             :param bool is_pre_scaled: If True, input is in blocks (convert to meters)
         '''
         with rasterio.open(elevation_file) as src:
-            elevation = src.read(1).astype(np.float32)
+            # Inland water detection is global (connectivity to the raster border), so this mask
+            # needs the whole raster; decode it straight to float32 rather than casting a copy
+            elevation = src.read(1, out_dtype=np.float32)
             
             # Convert from blocks to meters if needed
             if is_pre_scaled:
@@ -227,7 +271,7 @@ class MaskGenerator:
             
             # Save as RGB PNG
             img = Image.fromarray(seabed_mask, mode='RGB')
-            img.save(output_file)
+            img.save(output_file, compress_level=MASK_PNG_COMPRESS_LEVEL)
         
         log.info(f"[✓] Seabed cover mask saved: {output_file}")
 
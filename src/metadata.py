@@ -9,6 +9,7 @@ import numpy as np
 import rasterio
 from pathlib import Path
 from typing import Dict, Any, Tuple, Optional
+from src.kernels import elevation_stats
 
 log = logging.getLogger(__name__)
 
@@ -31,14 +32,25 @@ class MetadataGenerator:
         log.info(f"  Input: {elevation_file}")
         
         with rasterio.open(elevation_file) as src:
-            elevation = src.read(1).astype(np.float32)
-            elevation = np.nan_to_num(elevation, nan=0.0)
+            height, width = src.height, src.width
             
+            z_scale = np.float32(1.0)
             if is_pre_scaled:
                 v_scale = float(self.config['minecraft']['scale']['vertical'])
                 log.info(f" Converting pre-scaled elevation (blocks) to meters for metadata (scale: {v_scale})")
-                elevation *= v_scale
-            height, width = elevation.shape
+                z_scale = np.float32(v_scale)
+            
+            # Only summary statistics are needed, so stream the raster block by block
+            # (decoded straight to float32); each block is reduced in a single fused pass
+            min_elev, max_elev, total = np.inf, -np.inf, 0.0
+            for _, window in src.block_windows(1):
+                block_min, block_max, block_sum = elevation_stats(
+                    src.read(1, window=window, out_dtype=np.float32), z_scale
+                )
+                min_elev = min(min_elev, float(block_min))
+                max_elev = max(max_elev, float(block_max))
+                total += float(block_sum)
+            mean_elev = total / (height * width)
             
             # Extract config values
             meta_cfg = self.config['metadata']
@@ -58,8 +70,6 @@ class MetadataGenerator:
             
             width_km = (lon_max - lon_min) * lon_km_factor
             height_km = (lat_max - lat_min) * lat_km_factor
-            min_elev = float(elevation.min())
-            max_elev = float(elevation.max())
             mc_width = width
             mc_height = height
             
@@ -89,7 +99,7 @@ class MetadataGenerator:
                         "elevation": {
                             "min_meters": min_elev,
                             "max_meters": max_elev,
-                            "mean_meters": float(elevation.mean()),
+                            "mean_meters": mean_elev,
                             "range_meters": max_elev - min_elev
                         },
                         "heightmap": {
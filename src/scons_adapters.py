@@ -6,7 +6,6 @@ It extracts targets, sources, and environment variables, and calls the appropria
 
 from pathlib import Path
 import json
-import yaml
 import logging
 
 from src import (
@@ -111,7 +110,7 @@ class Map2CraftSConsAdapter:
         buildings_data = {}
         if buildings_json and Path(buildings_json).exists():
             with open(buildings_json, 'r', encoding='utf-8') as f:
-                buildings_data = yaml.safe_load(f)
+                buildings_data = json.load(f)
 
         # Split biomes
         biomes_dict = {}
@@ -1,6 +1,5 @@
 import logging
 import json
-import yaml
 import numpy as np
 import rasterio
 from pathlib import Path
@@ -11,7 +10,7 @@ from matplotlib.colors import ListedColormap
 from matplotlib.patches import Patch
 from typing import Dict, Tuple, Optional
 from src.constants import (
-    BIOME_COLORS, BIOME_NAMES, LAND_COVER_COLORS, LAND_COVER_NAMES,
+    BIOME_COLORS, biome_name, LAND_COVER_COLORS, LAND_COVER_NAMES,
     TERRAIN_COLORS, TERRAIN_NAMES_LIST, BUILDING_TYPE_STYLES,
     SEABED_COLORS, BIOME_IDS
 )
@@ -99,7 +98,7 @@ class MapVisualizer:
         for bid in sorted(np.unique(biome_data)):
             if bid in BIOME_COLORS: handles.append(Patch(
                 color=self._normalize_color(BIOME_COLORS[bid]), 
-                label=BIOME_NAMES.get(bid, f"Biome {bid}")
+                label=biome_name(int(bid))
             ))
 
         self._add_legend(handles, 'Biome Types')
@@ -263,7 +262,7 @@ class MapVisualizer:
         # Load building placements
         try:
             with open(placements_file, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
+                data = json.load(f)
             placements = data.get('placements', [])
             building_cnt = data.get('count', len(placements))
         except Exception as e:
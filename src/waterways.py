@@ -6,7 +6,8 @@ import rasterio
 from rasterio.features import rasterize
 from PIL import Image
 from shapely.geometry import shape, MultiLineString, LineString
-from shapely.ops import unary_union
+from shapely.ops import unary_union, transform as shapely_transform
+from src import geometry
 
 log = logging.getLogger(__name__)
 
@@ -35,15 +36,13 @@ class WaterwaysProcessor:
             res_x, res_y = abs(transform[0]), abs(transform[4])
             
             # Setup transformer: EPSG:4326 (OSM) -> Target CRS
-            from pyproj import Transformer
-            transformer = Transformer.from_crs("EPSG:4326", crs, always_xy=True) # lon,lat -> x,y
+            transformer = geometry.get_transformer("EPSG:4326", crs.to_wkt()) # lon,lat -> x,y
 
             for feature in data.get('features', []):
                 geom_4326 = shape(feature['geometry'])
                 
                 # Transform geometry
                 # shapely.ops.transform expects a function that takes x, y, z=None
-                from shapely.ops import transform as shapely_transform
                 geom_proj = shapely_transform(transformer.transform, geom_4326)
                 
                 tags = feature.get('properties', {})
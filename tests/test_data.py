@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from src.data import ElevationLoader
+
+TILE = "Copernicus_DSM_COG_10_N43_00_E003_00_DEM"
+NEW_DATA = b"new tile data"
+NEW_ETAG = '"new-etag"'
+
+
+class FakeS3:
+    def __init__(self):
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ETag': NEW_ETAG, 'ContentLength': len(NEW_DATA)}
+
+    def download_file(self, bucket, key, filename, Config=None):
+        self.downloads += 1
+        with open(filename, 'wb') as f: f.write(NEW_DATA)
+
+
+class FakeSession:
+    def head(self, url, timeout=None):
+        headers = {'ETag': NEW_ETAG, 'Content-Length': str(len(NEW_DATA))}
+        return SimpleNamespace(headers=headers, raise_for_status=lambda: None)
+
+
+def test_s3_download_replaces_stale_etag_sidecar(tmp_path):
+    tile = tmp_path / f"{TILE}.tif"
+    sidecar = tmp_path / f"{TILE}.tif.etag"
+    tile.write_bytes(b"old tile data")
+    sidecar.write_text('"old-etag"')
+
+    loader = ElevationLoader({})
+    loader.s3, loader.s3_transfer, loader.session = FakeS3(), None, FakeSession()
+
+    # The stale sidecar forces a download, which records the new ETag
+    assert loader.download_copernicus_tile(43.5, 3.5, tmp_path) == str(tile)
+    assert tile.read_bytes() == NEW_DATA
+    assert sidecar.read_text() == NEW_ETAG
+    assert not (tmp_path / f"{TILE}.tif.part").exists()
+
+    # The next build finds the tile current and does not download it again
+    assert loader.download_copernicus_tile(43.5, 3.5, tmp_path) == str(tile)
+    assert loader.s3.downloads == 1
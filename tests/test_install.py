@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from src.install import copy_tree
+
+
+def test_copy_tree_follows_symlinked_directories(tmp_path):
+    outside = tmp_path / "outside"
+    (outside / "nested").mkdir(parents=True)
+    (outside / "r.0.0.mca").write_bytes(b"region")
+    (outside / "nested" / "deep.dat").write_bytes(b"deep")
+
+    source = tmp_path / "world"
+    (source / "region").mkdir(parents=True)
+    (source / "level.dat").write_bytes(b"level")
+    (source / "region" / "r.1.0.mca").write_bytes(b"other")
+    try:
+        os.symlink(outside, source / "linked", target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip("symlinks not supported here")
+
+    target = tmp_path / "saves" / "world"
+    copy_tree(source, target)
+
+    assert (target / "level.dat").read_bytes() == b"level"
+    assert (target / "region" / "r.1.0.mca").read_bytes() == b"other"
+    assert (target / "linked").is_dir() and not (target / "linked").is_symlink()
+    assert (target / "linked" / "r.0.0.mca").read_bytes() == b"region"
+    assert (target / "linked" / "nested" / "deep.dat").read_bytes() == b"deep"
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src import geometry
+from src.masks import MaskGenerator
+
+
+def numpy_slope(elevation, spacing_y, spacing_x):
+    dy, dx = np.gradient(elevation, spacing_y, spacing_x)
+    return np.degrees(np.arctan(np.sqrt(dx**2 + dy**2)))
+
+
+@pytest.fixture
+def elevation():
+    rng = np.random.default_rng(7)
+    z = rng.normal(0, 1, (300, 310)).cumsum(0) * 4 + rng.normal(0, 1, (300, 310)).cumsum(1) * 3
+    return z.astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_slope_matches_numpy(elevation, dtype):
+    elevation = elevation.astype(dtype)
+    expected = numpy_slope(elevation, 30.0, 23.7)
+    np.testing.assert_array_equal(geometry.compute_slope_degrees(elevation, (30.0, 23.7)), expected)
+
+
+def test_slope_z_scale_matches_prescaled(elevation):
+    scaled = elevation.copy()
+    scaled *= 0.35
+    expected = numpy_slope(scaled, 12.5, 12.5)
+    np.testing.assert_array_equal(geometry.compute_slope_degrees(elevation, 12.5, 0.35), expected)
+
+
+@pytest.mark.parametrize("z_scale", [1.0, 0.35])
+def test_slope_mask_matches_numpy(elevation, z_scale):
+    scaled = elevation.copy()
+    if z_scale != 1.0: scaled *= z_scale
+    expected = np.clip(numpy_slope(scaled, 30.0, 23.7) / 45.0 * 255, 0, 255).astype(np.uint8)
+    mask = MaskGenerator({}).generate_slope_mask(elevation, (30.0, 23.7), 45.0, z_scale)
+    np.testing.assert_array_equal(mask, expected)